@@ -0,0 +1,601 @@
+#!/usr/bin/env python
+# SETMODE 777
+
+# ----------------------------------------------------------------------------------------#
+# ------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Andy Tran - axt170020
+
+:synopsis:
+    Compares hierarchy snapshots between disciplines.
+
+:description:
+    Takes the node paths read from the hierarchy text files and works out which
+    modeling nodes are missing, which were moved to another parent and which nodes
+    only exist downstream. Everything is done with dictionaries in a single pass so
+    it stays fast on big assets. Missing nodes also get rename suggestions from an
+    n-gram index of the extra nodes. Nothing in here needs Maya.
+
+:applications:
+    None, this is plain Python.
+
+:see_also:
+    hierarchy_check_utils.py
+"""
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from itertools import groupby, repeat
+from operator import itemgetter
+import heapq
+
+# External
+
+
+# ----------------------------------------------------------------------------------------#
+# --------------------------------------------------------------------------- FUNCTIONS --#
+
+def split_path(path=None):
+    """
+    Splits a node path into the parent path and the leaf name.
+    "|geometry_GRP|ren_GRP|pCylinder_REN" gives ("|geometry_GRP|ren_GRP",
+    "pCylinder_REN").
+
+    :param path: The full path of the node.
+    :type: str
+
+    :return: The parent path and the leaf name.
+    :type: tuple
+    """
+    if "|" not in path:
+        return "", path
+
+    return tuple(path.rsplit("|", 1))
+
+def get_subtree_signatures(paths=None):
+    """
+    Makes a signature for every node from its name and the names of everything under
+    it. Two groups with the same signature hold the same subtree, no matter where
+    they're parented.
+
+    :param paths: The full paths of the snapshot.
+    :type: list
+
+    :return: The signature for each path.
+    :type: dict
+    """
+    # Bucket the paths by depth so the deepest nodes are signed before their parents.
+    depths = {}
+    for path in paths:
+        depths.setdefault(path.count("|"), []).append(path)
+
+    child_sigs = {}
+    signatures = {}
+    for depth in sorted(depths, reverse=True):
+        for path in depths[depth]:
+            parent, leaf = split_path(path)
+            signatures[path] = hash((leaf, tuple(sorted(child_sigs.pop(path, [])))))
+            child_sigs.setdefault(parent, []).append(signatures[path])
+
+    return signatures
+
+def diff_hierarchies(model_nodes=None, other_nodes=None, discipline=None):
+    """
+    Compares a downstream snapshot to modeling. Extra downstream nodes are indexed by
+    leaf name, so a modeling node that isn't at its path can be looked up in one step
+    to see if it was moved. When a leaf name shows up more than once, the subtree
+    signature picks the right one.
+
+    :param model_nodes: The paths read from modeling, this sets the hierarchy.
+    :type: list
+
+    :param other_nodes: The paths read from the discipline we're checking.
+    :type: list
+
+    :param discipline: The discipline we're checking, only kept for reference.
+    :type: str
+
+    :return: The result of the comparison.
+    :type: HierarchyDiff
+    """
+    model_nodes = model_nodes or []
+    other_nodes = other_nodes or []
+    model_set = set(model_nodes)
+    other_set = set(other_nodes)
+
+    unmatched = [path for path in model_nodes if path not in other_set]
+    extra = [path for path in other_nodes if path not in model_set]
+
+    return classify_unmatched(unmatched, extra, model_nodes, other_nodes,
+                              discipline=discipline)
+
+def classify_unmatched(unmatched=None, extra=None, model_nodes=None, other_nodes=None,
+                       discipline=None):
+    """
+    Sorts out the modeling nodes that aren't at their path downstream into missing
+    and moved, then suggests renames for whatever is still missing.
+
+    :param unmatched: The modeling paths that aren't in the other snapshot.
+    :type: list
+
+    :param extra: The other snapshot's paths that aren't in modeling.
+    :type: list
+
+    :param model_nodes: All the modeling paths, only used for subtree signatures.
+    :type: list
+
+    :param other_nodes: All the other snapshot's paths, only used for subtree
+                        signatures.
+    :type: list
+
+    :param discipline: The discipline we're checking, only kept for reference.
+    :type: str
+
+    :return: The result of the comparison.
+    :type: HierarchyDiff
+    """
+    # Index everything that's downstream but not at a modeling path by the leaf name.
+    extra_by_leaf = {}
+    for path in extra:
+        extra_by_leaf.setdefault(split_path(path)[1], []).append(path)
+
+    model_sigs = None
+    other_sigs = None
+    result = HierarchyDiff(discipline=discipline)
+    for path in unmatched:
+        candidates = extra_by_leaf.get(split_path(path)[1])
+        if not candidates:
+            result.add_missing(path)
+            continue
+
+        # Only sign the snapshots if we actually run into a duplicate leaf name.
+        index = 0
+        if len(candidates) > 1:
+            if model_sigs is None:
+                model_sigs = get_subtree_signatures(model_nodes)
+                other_sigs = get_subtree_signatures(other_nodes)
+            for curr_index, candidate in enumerate(candidates):
+                if other_sigs[candidate] == model_sigs[path]:
+                    index = curr_index
+                    break
+
+        # Each downstream node can only be claimed by one modeling node.
+        result.add_moved(path, candidates.pop(index))
+
+    # Whatever wasn't claimed only exists downstream.
+    for path in extra:
+        if path not in result.arrived:
+            result.add_extra(path)
+
+    # Anything still missing might have just been renamed.
+    suggest_renames(result)
+
+    return result
+
+def diff_disciplines(snapshots=None, reference=None):
+    """
+    Compares any number of disciplines to a reference discipline at once. The sorted
+    snapshots are merged into one stream, so each path is looked at once to find
+    which disciplines have it, no matter how many disciplines there are. Each
+    discipline then gets its own HierarchyDiff with moves and renames.
+
+    :param snapshots: The paths of each discipline, ie. {"model": [...],
+                      "rig": [...], "layout": [...]}
+    :type: dict
+
+    :param reference: The discipline everything gets compared to, usually modeling.
+    :type: str
+
+    :return: The comparison of every discipline.
+    :type: MultiWayDiff
+    """
+    disciplines = [reference] + [disc for disc in snapshots if disc != reference]
+    bits = dict((disc, 1 << index) for index, disc in enumerate(disciplines))
+    reference_bit = bits[reference]
+
+    # Sorting is close to free on the text files, they're already written sorted.
+    sorted_snapshots = dict((disc, sorted(snapshots.get(disc) or [])) \
+                            for disc in disciplines)
+    streams = [zip(sorted_snapshots[disc], repeat(bits[disc])) for disc in disciplines]
+
+    result = MultiWayDiff(reference=reference, disciplines=disciplines)
+    unmatched = dict((disc, []) for disc in disciplines[1:])
+    extra = dict((disc, []) for disc in disciplines[1:])
+    for path, group in groupby(heapq.merge(*streams), key=itemgetter(0)):
+        mask = 0
+        for curr_path, bit in group:
+            mask |= bit
+        result.presence[path] = mask
+
+        # Sort the path into the lists of every discipline it doesn't match in.
+        for disc in disciplines[1:]:
+            if mask & reference_bit and not mask & bits[disc]:
+                unmatched[disc].append(path)
+            elif mask & bits[disc] and not mask & reference_bit:
+                extra[disc].append(path)
+
+    # Disciplines with nothing in them don't get compared.
+    for disc in disciplines[1:]:
+        if not sorted_snapshots[disc]:
+            continue
+        result.diffs[disc] = classify_unmatched(unmatched[disc], extra[disc],
+                                                sorted_snapshots[reference],
+                                                sorted_snapshots[disc],
+                                                discipline=disc)
+
+    return result
+
+def get_ngrams(name=None, size=3):
+    """
+    Breaks a node name into its n-grams. The name is padded so the start and end of
+    the name count too.
+
+    :param name: The leaf name of the node.
+    :type: str
+
+    :param size: How many characters in each n-gram.
+    :type: int
+
+    :return: The n-grams of the name.
+    :type: set
+    """
+    padded = "^%s$" % name.lower()
+
+    return set(padded[index:index + size] for index in \
+               range(max(len(padded) - size + 1, 1)))
+
+def suggest_renames(diff=None, min_score=0.5):
+    """
+    Matches the missing modeling nodes against the extra nodes under the same parent
+    and records the closest name as a likely rename. The extra nodes are put into
+    buckets by parent and n-gram, so each missing node only scores the candidates
+    that share something with it instead of every extra node.
+
+    :param diff: The comparison to add the suggestions to.
+    :type: HierarchyDiff
+
+    :param min_score: The lowest similarity, from 0 to 1, that counts as a rename.
+    :type: float
+
+    :return: The suggestions, modeling path to the downstream path.
+    :type: dict
+    """
+    if not diff.missing or not diff.extra:
+        return diff.renames
+
+    index = RenameIndex(diff.extra)
+    for path in diff.missing:
+        parent, leaf = split_path(path)
+        # If the parent was renamed too, look under the renamed parent.
+        if parent in diff.renames:
+            parent = diff.renames[parent][0]
+
+        match = index.find(parent, leaf, min_score=min_score)
+        if match:
+            diff.add_rename(path, match[0], match[1])
+            index.remove(match[0])
+
+    return diff.renames
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- CLASSES --#
+
+class NodeStatus(object):
+    """
+    The statuses a node can get from the comparison.
+    """
+    MATCH   = "match"
+    MISSING = "missing"
+    MOVED   = "moved"
+    EXTRA   = "extra"
+
+
+class RenameIndex(object):
+    """
+    Buckets node paths by their parent and the n-grams of their leaf name so similar
+    names under a parent can be found without comparing against everything.
+    """
+    # How many of the rarest n-grams are used to pull candidates, and how big a
+    # bucket can get before it's too common to narrow anything down.
+    RARE_GRAMS = 3
+    MAX_BUCKET = 200
+
+    def __init__(self, paths=None):
+        """
+        :param paths: The candidate paths, usually the extra nodes of a diff.
+        :type: list
+        """
+        self.buckets = {}
+        self.grams   = {}
+        for path in paths or []:
+            self.add(path)
+
+    def add(self, path):
+        """
+        Puts a path into the buckets.
+
+        :param path: The candidate path.
+        :type: str
+        """
+        parent, leaf = split_path(path)
+        self.grams[path] = get_ngrams(leaf)
+        for gram in self.grams[path]:
+            self.buckets.setdefault((parent, gram), set()).add(path)
+
+    def remove(self, path):
+        """
+        Takes a path out of the buckets so it can't be matched twice.
+
+        :param path: The candidate path.
+        :type: str
+        """
+        parent = split_path(path)[0]
+        for gram in self.grams.pop(path, []):
+            self.buckets[(parent, gram)].discard(path)
+
+    def find(self, parent, leaf, min_score=0.5):
+        """
+        Finds the most similar candidate under the parent. Similarity is the Dice
+        coefficient of the n-grams.
+
+        :param parent: The parent path the candidate has to be under.
+        :type: str
+
+        :param leaf: The name we're looking for something similar to.
+        :type: str
+
+        :param min_score: The lowest similarity, from 0 to 1, to accept.
+        :type: float
+
+        :return: The candidate path and its score, None if nothing was close enough.
+        :type: tuple
+        """
+        grams = get_ngrams(leaf)
+        buckets = [self.buckets.get((parent, gram)) for gram in grams]
+        buckets = sorted([bucket for bucket in buckets if bucket], key=len)
+        if not buckets:
+            return None
+
+        # A close name has to share at least one of the rarest n-grams, so only those
+        # buckets are used to pull candidates. Common ones like "_GEO" are skipped.
+        candidates = set(buckets[0])
+        for bucket in buckets[1:self.RARE_GRAMS]:
+            if len(bucket) > self.MAX_BUCKET:
+                break
+            candidates.update(bucket)
+
+        best = None
+        for path in candidates:
+            score = 2.0 * len(grams & self.grams[path]) / \
+                (len(grams) + len(self.grams[path]))
+            if score >= min_score and (not best or score > best[1]):
+                best = (path, score)
+
+        return best
+
+
+class MultiWayDiff(object):
+    """
+    Holds the comparison of every discipline to the reference discipline.
+    """
+    def __init__(self, reference=None, disciplines=None):
+        """
+        :param reference: The discipline everything was compared to.
+        :type: str
+
+        :param disciplines: All the disciplines, the reference first.
+        :type: list
+        """
+        self.reference   = reference
+        self.disciplines = list(disciplines or [])
+
+        # Path to a bit mask of the disciplines that have it, in the order of
+        # disciplines. The paths are in sorted order.
+        self.presence = {}
+        self.diffs    = {}
+
+    def get_presence(self, path):
+        """
+        Gets the disciplines a path shows up in.
+
+        :param path: The node path.
+        :type: str
+
+        :return: The disciplines, in the order of disciplines.
+        :type: list
+        """
+        mask = self.presence.get(path, 0)
+
+        return [disc for index, disc in enumerate(self.disciplines) \
+                if mask & (1 << index)]
+
+    def get_diff(self, disc):
+        """
+        :param disc: The discipline.
+        :type: str
+
+        :return: The discipline's comparison to the reference, None if it wasn't
+                 compared.
+        :type: HierarchyDiff
+        """
+        return self.diffs.get(disc)
+
+
+class HierarchyDiff(object):
+    """
+    Holds the result of comparing one discipline to modeling.
+    """
+    def __init__(self, discipline=None):
+        """
+        :param discipline: The discipline that was compared to modeling.
+        :type: str
+        """
+        self.discipline = discipline
+
+        self.missing  = []
+        self.moved    = {}
+        self.arrived  = {}
+        self.extra    = []
+        self.renames  = {}
+        self.failures = []
+        self.status   = {}
+
+        # Every failed path and all of its parents, so isolating the failures never
+        # has to walk the whole tree.
+        self.failure_subtrees = set()
+
+        self.arrived_renames = {}
+
+    def add_missing(self, path):
+        """
+        Records a modeling node that couldn't be found anywhere downstream.
+
+        :param path: The modeling path.
+        :type: str
+        """
+        self.missing.append(path)
+        self.failures.append(path)
+        self.status[path] = NodeStatus.MISSING
+        self._add_failure_subtree(path)
+
+    def add_moved(self, path, new_path):
+        """
+        Records a modeling node that was found under a different parent.
+
+        :param path: The modeling path.
+        :type: str
+
+        :param new_path: Where the node is downstream.
+        :type: str
+        """
+        self.moved[path] = new_path
+        self.arrived[new_path] = path
+        self.failures.append(path)
+        self.status[path] = NodeStatus.MOVED
+        self._add_failure_subtree(path)
+
+    def _add_failure_subtree(self, path):
+        """
+        Marks a failed path and its parents. It stops at the first parent that's
+        already marked, so each path is only marked once.
+
+        :param path: The failed modeling path.
+        :type: str
+        """
+        while path and path not in self.failure_subtrees:
+            self.failure_subtrees.add(path)
+            path = split_path(path)[0]
+
+    def subtree_has_failure(self, path):
+        """
+        :param path: The path of a node.
+        :type: str
+
+        :return: Whether the node or anything under it failed.
+        :type: bool
+        """
+        return path in self.failure_subtrees
+
+    def add_extra(self, path):
+        """
+        Records a downstream node that isn't in modeling.
+
+        :param path: The downstream path.
+        :type: str
+        """
+        self.extra.append(path)
+        self.status[path] = NodeStatus.EXTRA
+
+    def add_rename(self, path, new_path, score):
+        """
+        Records that a missing node was probably renamed. The node stays missing, this
+        is only a suggestion.
+
+        :param path: The missing modeling path.
+        :type: str
+
+        :param new_path: The extra downstream path it was probably renamed to.
+        :type: str
+
+        :param score: How similar the names are, from 0 to 1.
+        :type: float
+        """
+        self.renames[path] = (new_path, score)
+        self.arrived_renames[new_path] = path
+
+    def get_rename(self, path):
+        """
+        Gets the suggested new path of a missing node.
+
+        :param path: The modeling path.
+        :type: str
+
+        :return: The downstream path, None if there's no suggestion.
+        :type: str
+        """
+        if path not in self.renames:
+            return None
+
+        return self.renames[path][0]
+
+    def get_rename_source(self, path):
+        """
+        Gets the modeling path an extra node was probably renamed from.
+
+        :param path: The downstream path.
+        :type: str
+
+        :return: The modeling path, None if there's no suggestion.
+        :type: str
+        """
+        return self.arrived_renames.get(path)
+
+    def get_status(self, path):
+        """
+        Gets the status of a path, anything not recorded matched.
+
+        :param path: The modeling or downstream path.
+        :type: str
+
+        :return: One of the NodeStatus values.
+        :type: str
+        """
+        return self.status.get(path, NodeStatus.MATCH)
+
+    def get_move(self, path):
+        """
+        Gets the old and new parent of a moved node.
+
+        :param path: The modeling path.
+        :type: str
+
+        :return: The old parent path and the new parent path, None if it didn't move.
+        :type: tuple
+        """
+        if path not in self.moved:
+            return None
+
+        return split_path(path)[0], split_path(self.moved[path])[0]
+
+    def get_arrival(self, path):
+        """
+        Gets the modeling path of a downstream node that was moved there.
+
+        :param path: The downstream path.
+        :type: str
+
+        :return: The modeling path, None if nothing was moved there.
+        :type: str
+        """
+        return self.arrived.get(path)
+
+    def has_failures(self):
+        """
+        :return: Whether any modeling node is missing or moved.
+        :type: bool
+        """
+        return bool(self.failures)
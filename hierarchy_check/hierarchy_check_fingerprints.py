@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# SETMODE 777
+
+# ----------------------------------------------------------------------------------------#
+# ------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Andy Tran - axt170020
+
+:synopsis:
+    Geometry fingerprints stored next to the hierarchy snapshots.
+
+:description:
+    The hierarchy text files only hold names, so a mesh that kept its name but got
+    swapped for different geometry passes the check. This keeps a fingerprint of
+    every mesh (vertex, face and UV counts, the bounding box and a hash of the point
+    positions) as NumPy columns so the whole asset is compared at once.
+
+:applications:
+    NumPy. Without it, fingerprints are skipped.
+
+:see_also:
+    hierarchy_check_utils.py
+"""
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import hashlib
+import os
+
+# External
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# ----------------------------------------------------------------------------------------#
+# --------------------------------------------------------------------------- FUNCTIONS --#
+
+def has_numpy():
+    """
+    :return: Whether NumPy could be imported, fingerprints need it.
+    :type: bool
+    """
+    return np is not None
+
+def get_fingerprint_path(text_file_path=None):
+    """
+    Gets where the fingerprints live for a hierarchy text file, right next to it.
+    "asset_hier.txt" gives "asset_hier.npz".
+
+    :param text_file_path: The hierarchy text file.
+    :type: str
+
+    :return: The fingerprint file path.
+    :type: str
+    """
+    return "%s.npz" % os.path.splitext(text_file_path)[0]
+
+def hash_points(points=None, decimals=4):
+    """
+    Hashes point positions. The positions are rounded first so tiny float noise
+    between saves doesn't count as a change.
+
+    :param points: The flat list of point positions, x y z x y z...
+    :type: list
+
+    :param decimals: How many decimals to keep before hashing.
+    :type: int
+
+    :return: The hash of the positions.
+    :type: int
+    """
+    rounded = np.round(np.asarray(points, dtype=np.float64), decimals)
+    digest = hashlib.md5(rounded.astype(np.float32).tobytes()).digest()
+
+    return int.from_bytes(digest[:8], "little")
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- CLASSES --#
+
+class GeometryFingerprints(object):
+    """
+    The fingerprints of every mesh in a snapshot, one NumPy array per field. Row i
+    of every array belongs to paths[i].
+    """
+    COUNT_FIELDS = ("vertex_count", "face_count", "uv_count")
+    FIELDS       = COUNT_FIELDS + ("bbox", "point_hash")
+
+    def __init__(self, paths=None, vertex_count=None, face_count=None, uv_count=None,
+                 bbox=None, point_hash=None):
+        """
+        :param paths: The normalized node paths.
+        :type: numpy.ndarray
+
+        :param vertex_count: The vertex count of each mesh.
+        :type: numpy.ndarray
+
+        :param face_count: The face count of each mesh.
+        :type: numpy.ndarray
+
+        :param uv_count: The UV count of each mesh.
+        :type: numpy.ndarray
+
+        :param bbox: The object space bounding box of each mesh, an (n, 6) array of
+                     xmin, xmax, ymin, ymax, zmin, zmax.
+        :type: numpy.ndarray
+
+        :param point_hash: The hash of the point positions of each mesh.
+        :type: numpy.ndarray
+        """
+        self.paths        = paths
+        self.vertex_count = vertex_count
+        self.face_count   = face_count
+        self.uv_count     = uv_count
+        self.bbox         = bbox
+        self.point_hash   = point_hash
+
+    @classmethod
+    def from_rows(cls, rows=None):
+        """
+        Builds the columns from one row per mesh.
+
+        :param rows: Tuples of (path, vertex_count, face_count, uv_count, bbox,
+                     point_hash).
+        :type: list
+
+        :return: The fingerprints.
+        :type: GeometryFingerprints
+        """
+        rows = list(rows or [])
+        columns = list(zip(*rows)) if rows else [[]] * 6
+
+        return cls(paths=np.array(columns[0], dtype=np.str_),
+                   vertex_count=np.array(columns[1], dtype=np.int64),
+                   face_count=np.array(columns[2], dtype=np.int64),
+                   uv_count=np.array(columns[3], dtype=np.int64),
+                   bbox=np.array(columns[4], dtype=np.float64).reshape(-1, 6),
+                   point_hash=np.array(columns[5], dtype=np.uint64))
+
+    @classmethod
+    def load(cls, file_path=None):
+        """
+        Reads the fingerprints saved with save.
+
+        :param file_path: The .npz file.
+        :type: str
+
+        :return: The fingerprints, None if there's no file.
+        :type: GeometryFingerprints
+        """
+        if not file_path or not os.path.exists(file_path):
+            return None
+
+        with np.load(file_path) as data:
+            return cls(**dict((field, data[field]) for field in ("paths",) + cls.FIELDS))
+
+    def save(self, file_path=None):
+        """
+        Writes the columns to an .npz file.
+
+        :param file_path: The .npz file.
+        :type: str
+        """
+        columns = dict((field, getattr(self, field)) for field in ("paths",) + self.FIELDS)
+        with open(file_path, "wb") as file1:
+            np.savez(file1, **columns)
+
+    def select(self, paths=None):
+        """
+        Keeps only the rows of some paths, ie. for a scoped snapshot.
+
+        :param paths: The paths to keep.
+        :type: list
+
+        :return: The fingerprints of those paths.
+        :type: GeometryFingerprints
+        """
+        mask = np.isin(self.paths, np.array(list(paths or []), dtype=np.str_))
+
+        return GeometryFingerprints(**dict((field, getattr(self, field)[mask]) \
+                                           for field in ("paths",) + self.FIELDS))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def compare(self, other=None, tolerance=1e-4):
+        """
+        Compares these fingerprints to another snapshot's. The meshes are lined up by
+        path and every field is compared across all of them at once.
+
+        :param other: The fingerprints to compare against, usually modeling.
+        :type: GeometryFingerprints
+
+        :param tolerance: How far the bounding boxes can be off and still match.
+        :type: float
+
+        :return: The changed fields for each path that changed, ie.
+                 {"|geometry_GRP|ren_GRP|pCylinder_REN": ["vertex_count", "bbox"]}
+        :type: dict
+        """
+        if other is None or not len(self) or not len(other):
+            return {}
+
+        # Only meshes in both snapshots can be compared, missing nodes are the diff's job.
+        paths, self_index, other_index = np.intersect1d(self.paths, other.paths,
+                                                        assume_unique=True,
+                                                        return_indices=True)
+        changed = {}
+        for field in self.COUNT_FIELDS + ("point_hash",):
+            changed[field] = getattr(self, field)[self_index] != \
+                getattr(other, field)[other_index]
+        changed["bbox"] = ~np.all(np.isclose(self.bbox[self_index],
+                                             other.bbox[other_index],
+                                             atol=tolerance), axis=1)
+
+        # Only build the dictionary for the rows that changed.
+        any_changed = np.zeros(len(paths), dtype=bool)
+        for field in changed:
+            any_changed |= changed[field]
+
+        changes = {}
+        for row in np.flatnonzero(any_changed):
+            changes[str(paths[row])] = [field for field in self.FIELDS \
+                                        if changed[field][row]]
+
+        return changes
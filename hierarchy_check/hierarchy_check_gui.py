@@ -26,6 +26,8 @@
 
 # Default Python Imports
 from PySide2 import QtGui, QtCore, QtWidgets
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import os
 
 # External
@@ -37,6 +39,10 @@ from shotgun_tools.sg_utils import get_sg_user_projects
 from maya_tools.guis.maya_guis import ConfirmDialog
 from maya_tools.guis.maya_gui_utils import get_maya_window, make_line
 from maya_tools.utils.hierarchy_check_utils import HierarchyCheckUtil
+from maya_tools.utils.hierarchy_check_fingerprints import has_numpy
+from maya_tools.utils.hierarchy_check_diff import NodeStatus
+from maya_tools.utils.hierarchy_check_prefetch import SnapshotPrefetcher
+from maya_tools.utils.hierarchy_check_search import HierarchySearchIndex
 
 #----------------------------------------------------------------------------------------#
 #--------------------------------------------------------------------------- FUNCTIONS --#
@@ -48,7 +54,24 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
     """
     Class for the GUI.
     """
-    def __init__(self, context=None):
+    # The pane titles, any other discipline is just capitalized.
+    DISC_LABELS = {Discipline.MODEL.name: "Modeling",
+                   Discipline.RIG.name: "Rigging",
+                   Discipline.SURFACE.name: "Surfacing"}
+
+    # The most search results listed at once.
+    MAX_SEARCH_RESULTS = 200
+
+    def __init__(self, context=None, disciplines=None):
+        """
+        :param context: The pipe context used to find the files.
+        :type: PipeContext
+
+        :param disciplines: The disciplines to show a pane for. The first one sets
+                            the hierarchy, the default is modeling, rigging and
+                            surfacing.
+        :type: list
+        """
         QtWidgets.QDialog.__init__(self, parent=get_maya_window())
 
         # Essentials for finding a project.
@@ -60,33 +83,53 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
         self.all_assets = None
 
         # The asset discilpines we'll grab from.
-        self.asset_disc_list = [Discipline.MODEL.name,
-                                Discipline.RIG.name,
-                                Discipline.SURFACE.name]
+        self.asset_disc_list = list(disciplines or [Discipline.MODEL.name,
+                                                    Discipline.RIG.name,
+                                                    Discipline.SURFACE.name])
 
         if not context:
             self.context = PipeContext.basic()
         else:
             self.context = context
 
+        # One layout, tree view and icon label for each discipline. Modeling doesn't
+        # get an icon.
         self.selection_layout = None
-        self.line1            = None
-        self.model_layout     = None
-        self.line2            = None
-        self.rig_layout       = None
-        self.line3            = None
-        self.surface_layout   = None
-
-        self.model_tree_view   = None
-        self.rig_tree_view     = None
-        self.surface_tree_view = None
-
-        self.rig_icon_lbl     = None
-        self.surface_icon_lbl = None
+        self.lines            = []
+        self.disc_layouts     = {}
+        self.tree_views       = {}
+        self.icon_lbls        = {}
+
+        # The tree widget items of each discipline by path, and the ones hidden when
+        # isolating so they can be revealed again.
+        self.tree_items   = {}
+        self.hidden_items = {}
+
+        # The search index of the check shown, and whether a selection is being copied
+        # to the other panes so they don't copy it back. The index is built in a
+        # thread, the timer picks it up once it's done.
+        self.search_index  = None
+        self.syncing       = False
+        self.search_pool   = ThreadPoolExecutor(max_workers=1)
+        self.search_future = None
+        self.search_timer  = QtCore.QTimer(self)
+        self.search_timer.setInterval(50)
+        self.search_timer.timeout.connect(self.search_index_ready)
+
         self.icon_file_names  = ["accept_icon.png", "warning_icon.png", "cancel_icon.png"]
         self.icon_paths       = []
 
-        self.hier_check_util = HierarchyCheckUtil()
+        # Compare the geometry under matching paths too, when NumPy is around for it.
+        self.fingerprint = has_numpy()
+
+        self.hier_check_util = HierarchyCheckUtil(context=self.context,
+                                                  fingerprint=self.fingerprint,
+                                                  disciplines=self.asset_disc_list)
+
+        # Reads the hierarchies in the background as soon as an asset is picked.
+        self.prefetcher = SnapshotPrefetcher(context=self.context,
+                                             fingerprint=self.fingerprint,
+                                             disciplines=self.asset_disc_list)
 
     def init_gui(self):
         """
@@ -99,32 +142,40 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
 
         # Creates the select layout.
         self.selection_layout = self.create_selection_layout()
-        self.line1 = make_line(orientation="vertical")
-
-        # Creates the model layout.
-        self.model_layout = self.create_model_layout()
-        self.line2 = make_line(orientation="vertical")
-
-        # Creates the rig layout.
-        self.rig_layout = self.create_rig_layout()
-        self.line3 = make_line(orientation="vertical")
+        main_hb.addLayout(self.selection_layout)
 
-        # Creates the surfacing layout.
-        self.surface_layout = self.create_surface_layout()
+        # Creates the model layout, then one layout for every other discipline, with
+        # a line before each.
+        for curr_disc in self.asset_disc_list:
+            if curr_disc == self.asset_disc_list[0]:
+                self.disc_layouts[curr_disc] = self.create_model_layout()
+            else:
+                self.disc_layouts[curr_disc] = self.create_disc_layout(curr_disc)
+            self.lines.append(make_line(orientation="vertical"))
+            main_hb.addWidget(self.lines[-1])
+            main_hb.addLayout(self.disc_layouts[curr_disc])
 
-        # Adds all the elements to the main layout.
-        main_hb.addLayout(self.selection_layout)
-        main_hb.addWidget(self.line1)
-        main_hb.addLayout(self.model_layout)
-        main_hb.addWidget(self.line2)
-        main_hb.addLayout(self.rig_layout)
-        main_hb.addWidget(self.line3)
-        main_hb.addLayout(self.surface_layout)
+            # Selecting a node in one pane selects it in the others.
+            self.tree_views[curr_disc].currentItemChanged.connect(
+                partial(self.tree_item_changed, curr_disc))
 
         self.setWindowTitle("Hierarchy Check")
         self.setMinimumSize(800, 200)
         self.show()
 
+    def closeEvent(self, event):
+        """
+        Stops the prefetching and indexing when the GUI closes.
+
+        :param event: The close event.
+        :type: QtGui.QCloseEvent
+        """
+        self.prefetcher.shutdown()
+        self.search_timer.stop()
+        self.search_future = None
+        self.search_pool.shutdown(wait=False)
+        QtWidgets.QDialog.closeEvent(self, event)
+
     def create_selection_layout(self):
         """
         Builds the selection section of the GUI.
@@ -175,6 +226,26 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
         self.isolate_check_box.clicked.connect(self.isolate_check_box_clicked)
         select_vb.addWidget(self.isolate_check_box)
 
+        # Flag meshes whose geometry changed under a matching path, needs NumPy.
+        self.geometry_check_box = QtWidgets.QCheckBox("Compare Geometry")
+        self.geometry_check_box.setChecked(self.fingerprint)
+        self.geometry_check_box.setEnabled(has_numpy())
+        self.geometry_check_box.setToolTip("Text files made without it have to be "
+                                           "deleted and made again to compare.")
+        self.geometry_check_box.clicked.connect(self.geometry_check_box_clicked)
+        select_vb.addWidget(self.geometry_check_box)
+
+        # Search every pane as you type, picking a result selects it in all of them.
+        search_lbl = QtWidgets.QLabel("Search:")
+        select_vb.addWidget(search_lbl)
+        self.search_le = QtWidgets.QLineEdit()
+        self.search_le.setPlaceholderText("Node name or |path")
+        self.search_le.textChanged.connect(self.search_text_changed)
+        select_vb.addWidget(self.search_le)
+        self.search_lw = QtWidgets.QListWidget()
+        self.search_lw.currentTextChanged.connect(self.search_result_selected)
+        select_vb.addWidget(self.search_lw)
+
         select_vb.addStretch(1)
 
         return select_vb
@@ -189,78 +260,66 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
         model_vb = QtWidgets.QVBoxLayout()
 
         # Create simple label.
-        model_lbl = QtWidgets.QLabel("Modeling")
+        model_disc = self.asset_disc_list[0]
+        model_lbl = QtWidgets.QLabel(self.get_disc_label(model_disc))
 
         # Create Modeling Tree Widget.
-        self.model_tree_view = QtWidgets.QTreeWidget()
-        self.model_tree_view.setHeaderLabels(["Groups"])
+        model_tree_view = QtWidgets.QTreeWidget()
+        model_tree_view.setHeaderLabels(["Groups"])
+        self.tree_views[model_disc] = model_tree_view
 
         model_vb.addWidget(model_lbl)
-        model_vb.addWidget(self.model_tree_view)
+        model_vb.addWidget(model_tree_view)
 
         return model_vb
 
-    def create_rig_layout(self):
+    def create_disc_layout(self, disc):
         """
-        Builds the rig section of the GUI.
+        Builds the section of the GUI for a discipline compared to modeling.
+
+        :param disc: The discipline.
+        :type: str
 
-        :return: The rig section.
+        :return: The discipline's section.
         :type: QtWidgets.QVBoxLayout
         """
-        rig_vb = QtWidgets.QVBoxLayout()
+        disc_vb = QtWidgets.QVBoxLayout()
 
         # Top HBox
         top_hb = QtWidgets.QHBoxLayout()
 
         # Simple label.
-        rig_lbl = QtWidgets.QLabel("Rigging")
-        top_hb.addWidget(rig_lbl)
+        disc_lbl = QtWidgets.QLabel(self.get_disc_label(disc))
+        top_hb.addWidget(disc_lbl)
 
         # Simple label to hold the pass/fail icon.
-        self.rig_icon_lbl = QtWidgets.QLabel()
-        self.rig_icon_lbl.setAlignment(QtCore.Qt.AlignRight)
-        top_hb.addWidget(self.rig_icon_lbl)
+        icon_lbl = QtWidgets.QLabel()
+        icon_lbl.setAlignment(QtCore.Qt.AlignRight)
+        top_hb.addWidget(icon_lbl)
+        self.icon_lbls[disc] = icon_lbl
 
-        # Rig Tree Widget.
-        self.rig_tree_view = QtWidgets.QTreeWidget()
-        self.rig_tree_view.setHeaderLabels(["Groups", "Status"])
-        self.rig_tree_view.setColumnWidth(0, 200)
+        # The discipline's Tree Widget.
+        tree_view = QtWidgets.QTreeWidget()
+        tree_view.setHeaderLabels(["Groups", "Status"])
+        tree_view.setColumnWidth(0, 200)
+        self.tree_views[disc] = tree_view
 
-        rig_vb.addLayout(top_hb)
-        rig_vb.addWidget(self.rig_tree_view)
+        disc_vb.addLayout(top_hb)
+        disc_vb.addWidget(tree_view)
 
-        return rig_vb
+        return disc_vb
 
-    def create_surface_layout(self):
+    def get_disc_label(self, disc):
         """
-        Builds the surface section of the GUI.
-
-        :return: The surface section.
-        :type: QtWidgets.QVBoxLayout
-        """
-        surface_vb = QtWidgets.QVBoxLayout()
-
-        # Top HBox
-        top_hb = QtWidgets.QHBoxLayout()
+        Gets the title of a discipline's pane.
 
-        # Simple label.
-        surface_lbl = QtWidgets.QLabel("Surfacing")
-        top_hb.addWidget(surface_lbl)
-
-        # Simple label to hold the pass/fail icon.
-        self.surface_icon_lbl = QtWidgets.QLabel()
-        self.surface_icon_lbl.setAlignment(QtCore.Qt.AlignRight)
-        top_hb.addWidget(self.surface_icon_lbl)
-
-        # Surfacing Tree Widget.
-        self.surface_tree_view = QtWidgets.QTreeWidget()
-        self.surface_tree_view.setHeaderLabels(["Groups", "Status"])
-        self.surface_tree_view.setColumnWidth(0, 200)
-
-        surface_vb.addLayout(top_hb)
-        surface_vb.addWidget(self.surface_tree_view)
+        :param disc: The discipline.
+        :type: str
 
-        return surface_vb
+        :return: The title, ie. "Rigging".
+        :type: str
+        """
+        return self.DISC_LABELS.get(disc, disc.capitalize())
 
     def get_icon_path(self, file_name):
         """
@@ -294,6 +353,9 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
             self.project = None
             return None
 
+        # Nothing prefetched for the old project is useful anymore.
+        self.prefetcher.cancel(clear=True)
+
         # We want the project obj b/c we can get the assets and shots from it.
         self.project = self.project_reader.get_project_object(value)
 
@@ -315,11 +377,15 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
         value = str(item)
         if value == "None" or value == "":
             self.asset_obj = None
+            self.prefetcher.cancel()
             return None
 
         # Get the info for the asset.
         self.asset_obj = self.project.get_asset(value)
 
+        # Start reading this asset and its neighbors before anyone asks for them.
+        self.prefetcher.schedule(self.project, value, self.all_assets)
+
     def delete_curr_btn_clicked(self):
         """
         Deletes the existing text documents.
@@ -340,6 +406,9 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
         # Send the hierarchy check the asset_obj.
         self.hier_check_util.set_asset_obj(self.asset_obj)
 
+        # Whatever was prefetched came from the files we're deleting.
+        self.prefetcher.discard(self.asset_obj.name)
+
         if not self.hier_check_util.delete_text_files():
             return None
 
@@ -359,9 +428,14 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
         self.hier_check_util.set_asset_obj(self.asset_obj)
 
         # Clears the previous tree views.
-        self.model_tree_view.clear()
-        self.rig_tree_view.clear()
-        self.surface_tree_view.clear()
+        for curr_disc in self.tree_views:
+            self.tree_views[curr_disc].clear()
+        self.tree_items.clear()
+        self.hidden_items.clear()
+        self.search_index = None
+        self.search_future = None
+        self.search_timer.stop()
+        self.search_lw.clear()
 
         # Clear's the utility's attributes for the next asset.
         self.hier_check_util.clear_attrs()
@@ -371,12 +445,23 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
             IO.error("Invalid asset object passed to utils.")
             return None
 
-        # Gets the info for the hier_check_util. Any error will display from utils.
-        if not self.hier_check_util.get_info():
+        # Use the prefetched info if it's there, waiting on it if it's still coming.
+        # Otherwise gets the info for the hier_check_util. Any error will display from
+        # utils.
+        prefetched = self.prefetcher.get(self.asset_obj.name, wait=True)
+        if prefetched:
+            self.hier_check_util = prefetched
+        elif not self.hier_check_util.get_info():
             return None
 
-        # Populate the tree with the results.
+        # Populate the tree with the results, keep it isolated if the box is checked.
         self.populate_tree_view()
+        self.isolate_check_box_clicked()
+
+        # Index the nodes once for searching, off the GUI thread.
+        self.search_future = self.search_pool.submit(HierarchySearchIndex.from_util,
+                                                     self.hier_check_util)
+        self.search_timer.start()
 
         # Set the pass, warning, or fail icons for rigging and surfacing.
         self.set_icon()
@@ -387,10 +472,9 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
         """
         Populates the tree views.
         """
-        # Get the useful lists and dicts from the util.
-        rig_fails = self.hier_check_util.get_rig_fail()
-        surface_fails = self.hier_check_util.get_surface_fail()
+        # Get the useful dicts from the util.
         read_hier = self.hier_check_util.get_read_hiers()
+        model_disc = self.asset_disc_list[0]
 
         for curr_disc in self.asset_disc_list:
             # Check if it exists in the dictionary. Any txt that doesn't exist already
@@ -399,157 +483,328 @@ class HierarchyCheckGUI(QtWidgets.QDialog):
                 continue
 
             # Make the root "geometry_GRP", and parent to the respective view.
-            tree_view = None
-            if curr_disc == Discipline.MODEL.name:
-                tree_view = self.model_tree_view
-            elif curr_disc == Discipline.RIG.name:
-                tree_view = self.rig_tree_view
-            elif curr_disc == Discipline.SURFACE.name:
-                tree_view = self.surface_tree_view
+            tree_view = self.tree_views[curr_disc]
             root = QtWidgets.QTreeWidgetItem(tree_view,
                                              [read_hier[curr_disc][0][1:], ""])
+            root.setData(0, QtCore.Qt.UserRole, read_hier[curr_disc][0])
 
             # Iterate through everything past the first element, adding the items that
             # failed. B/c the items that failed are in modeling not in rig or surfacing.
             list_items = read_hier[curr_disc][1:]
-            if curr_disc == Discipline.RIG.name:
-                list_items += rig_fails
-            elif curr_disc == Discipline.SURFACE.name:
-                list_items += surface_fails
-
-            # Make lists that will hold the names and tree widget items so they
-            # can be parents to other QTreeWidgetItems. The first is "geometry_GRP".
-            temp_grp_names = [read_hier[curr_disc][0].split("|")]
-            temp_grp_tree_widget_list = [root]
+            if curr_disc != model_disc:
+                list_items += self.hier_check_util.get_fail(curr_disc)
+
+            # Keep every tree widget item by its path so they can be parents to other
+            # QTreeWidgetItems, and so isolating can find them. The first is
+            # "geometry_GRP".
+            tree_items = {read_hier[curr_disc][0]: root}
+            self.tree_items[curr_disc] = tree_items
             for item in list_items:
 
-                # First split the string without the dividers into a list.
-                # Looks like ['', 'geometry_GRP', 'ren_GRP', 'pCylinder_REN']
-                item_split = item.split("|")
-                # Keep the parent as a list b/c the entire list leads up to the item
-                # so we use a pointer to the list as a unique identifier for the parent.
-                item_parent_list = item_split[:-1]
-                # Use the parent list to find the index from the temp_grp_names.
-                parent_index = temp_grp_names.index(item_parent_list)
-
-                # Make the TreeWidgetItem, parent it to the parent_index we found.
-                entry = QtWidgets.QTreeWidgetItem(temp_grp_tree_widget_list\
-                                                    [parent_index], [item_split[-1], ""])
+                # The parent's path is everything before the last divider.
+                # '|geometry_GRP|ren_GRP|pCylinder_REN' gives '|geometry_GRP|ren_GRP'
+                item_parent, item_name = item.rsplit("|", 1)
+
+                # Make the TreeWidgetItem, parent it to the parent we found.
+                entry = QtWidgets.QTreeWidgetItem(tree_items[item_parent],
+                                                  [item_name, ""])
+                entry.setData(0, QtCore.Qt.UserRole, item)
                 entry.setExpanded(True)
 
-                # Save the current list to an overall list so we can reference the tree
-                # widget item later if it happens to be a parent.
-                temp_grp_names.append(item_split)
-                temp_grp_tree_widget_list.append(entry)
+                # Save the item in case it happens to be a parent.
+                tree_items[item] = entry
 
                 # Sets the background depending if they kept the hierarchy.
                 # Sets rigging or surfacing if they didn't conform.
-                if curr_disc == Discipline.MODEL.name:
+                if curr_disc == model_disc:
                     continue
-                if curr_disc == Discipline.RIG.name:
-                    if item in rig_fails:
-                        entry.setBackground(1, QtGui.QBrush(QtGui.QColor('darkRed')))
-                if curr_disc == Discipline.SURFACE.name:
-                    if item in surface_fails:
-                        entry.setBackground(1, QtGui.QBrush(QtGui.QColor('darkRed')))
+                diff = self.hier_check_util.get_diff(curr_disc)
+                entry.setText(1, self.get_status_text(diff, item))
+                if diff.get_status(item) in (NodeStatus.MISSING, NodeStatus.MOVED):
+                    entry.setBackground(1, QtGui.QBrush(QtGui.QColor('darkRed')))
+
+                # Kept the hierarchy but the geometry underneath was swapped.
+                geo_changes = self.hier_check_util.get_geo_changes(curr_disc)
+                if item in geo_changes:
+                    entry.setText(1, "Geometry changed: %s" % \
+                                  ", ".join(geo_changes[item]))
+                    entry.setBackground(1, QtGui.QBrush(QtGui.QColor('darkGoldenrod')))
 
             root.setExpanded(True)
 
+    def get_status_text(self, diff, path):
+        """
+        Gets the text for the status column of a node.
+
+        :param diff: The comparison for the discipline the node is in.
+        :type: HierarchyDiff
+
+        :param path: The path of the node.
+        :type: str
+
+        :return: The status text, empty if the node matched.
+        :type: str
+        """
+        status = diff.get_status(path)
+        if status == NodeStatus.MISSING and diff.get_rename(path):
+            return "Missing, renamed to %s?" % diff.get_rename(path).rsplit("|", 1)[-1]
+        elif status == NodeStatus.MISSING:
+            return "Missing"
+        elif status == NodeStatus.MOVED:
+            return "Moved to %s" % diff.get_move(path)[1]
+        elif status == NodeStatus.EXTRA and diff.get_rename_source(path):
+            return "Extra, renamed from %s?" % \
+                diff.get_rename_source(path).rsplit("|", 1)[-1]
+        elif status == NodeStatus.EXTRA:
+            return "Extra"
+        elif diff.get_arrival(path):
+            return "Moved from %s" % diff.get_arrival(path).rsplit("|", 1)[0]
+
+        return ""
+
     def isolate_check_box_clicked(self):
         """
         Isolates the missing nodes in rigging and surfacing.
         """
         # If checked, then hide whatever is in rig and surfacing.
-        if self.isolate_check_box.checkState():
-            root = self.rig_tree_view.invisibleRootItem()
-            if root.childCount() > 0:
-                self._isolate_checked(root)
+        for curr_disc in self.asset_disc_list[1:]:
+            if self.isolate_check_box.checkState():
+                self._isolate_checked(curr_disc, self.tree_views[curr_disc])
 
-            root = self.surface_tree_view.invisibleRootItem()
-            if root.childCount() > 0:
-                self._isolate_checked(root)
+            # Otherwise reveal what was hidden in the tree views.
+            else:
+                self._reveal_hidden(curr_disc, self.tree_views[curr_disc])
 
-        # Otherwise reveal all items in the tree views.
-        else:
-            root = self.rig_tree_view.invisibleRootItem()
-            if root.childCount() > 0:
-                self._reveal_hidden(root)
+    def geometry_check_box_clicked(self):
+        """
+        Turns comparing the geometry on or off for the next "Get Hierarchy".
+        """
+        self.fingerprint = bool(self.geometry_check_box.isChecked())
+        self.hier_check_util.fingerprint = self.fingerprint
+        self.prefetcher.fingerprint = self.fingerprint
 
-            root = self.surface_tree_view.invisibleRootItem()
-            if root.childCount() > 0:
-                self._reveal_hidden(root)
+        # Whatever was prefetched was read the other way.
+        self.prefetcher.cancel(clear=True)
+        if self.project and self.asset_obj:
+            self.prefetcher.schedule(self.project, self.asset_obj.name, self.all_assets)
 
-    def _isolate_checked(self, parent):
+    def _isolate_checked(self, disc, tree_view):
         """
-        Recursively go through the hierarchy finding any children that are red will skip
-        this parent. If there are no red in the child hierarchy that means this parent is
-        find to hide.
+        Hides everything that doesn't lead to a failure. The diff already knows which
+        paths have a failure somewhere under them, so only the children of those paths
+        need to be looked at. Hiding a parent hides everything under it, so the rest of
+        the tree is never touched.
 
-        :param parent: The parent we will get the child count from.
-        :type: QtWidgets.QTreeWidgetItem
+        :param disc: The discipline of the tree view.
+        :type: str
+
+        :param tree_view: The tree view to isolate.
+        :type: QtWidgets.QTreeWidget
         """
-        # The base case. If this item is red, then return False because it informs
-        # the parent whether to hide. Otherwise hide then return True.
-        if not parent.childCount() > 0:
-            if parent.backgroundColor(1) == QtGui.QColor('darkRed'):
-                return False
-            else:
-                parent.setHidden(True)
-                return True
+        diff = self.hier_check_util.get_diff(disc)
+        tree_items = self.tree_items.get(disc)
+        if not diff or not tree_items or self.hidden_items.get(disc):
+            return None
 
-        # There are children to check.
-        else:
-            child_count = parent.childCount()
-            # This list will determine if this parent will hide or not.
-            pass_list = []
-            for child_index in range(child_count):
-                pass_list.append(self._isolate_checked(parent.child(child_index)))
-            if False in pass_list:
-                return False
-            else:
-                parent.setHidden(True)
+        # Only one repaint at the end instead of one for each item.
+        tree_view.setUpdatesEnabled(False)
+        hidden = []
+
+        # The root itself goes if nothing under it failed.
+        root = tree_view.invisibleRootItem()
+        candidates = [root.child(index) for index in range(root.childCount())]
+        for path in diff.failure_subtrees:
+            parent = tree_items.get(path)
+            if parent is None:
+                continue
+            candidates.extend(parent.child(index) for index in range(parent.childCount()))
+
+        for item in candidates:
+            if not diff.subtree_has_failure(item.data(0, QtCore.Qt.UserRole)):
+                item.setHidden(True)
+                hidden.append(item)
+
+        self.hidden_items[disc] = hidden
+        tree_view.setUpdatesEnabled(True)
+
+    def _reveal_hidden(self, disc, tree_view):
+        """
+        Unhides only the items that were hidden when isolating.
+
+        :param disc: The discipline of the tree view.
+        :type: str
+
+        :param tree_view: The tree view to reveal.
+        :type: QtWidgets.QTreeWidget
+        """
+        hidden = self.hidden_items.pop(disc, None)
+        if not hidden:
+            return None
+
+        tree_view.setUpdatesEnabled(False)
+        for item in hidden:
+            item.setHidden(False)
+        tree_view.setUpdatesEnabled(True)
+
+    def search_index_ready(self):
+        """
+        Takes the search index once its thread is done, and redoes a search that was
+        typed while it was building.
+        """
+        if self.search_future is None:
+            self.search_timer.stop()
+            return None
+        elif not self.search_future.done():
+            return None
+
+        self.search_timer.stop()
+        search_future = self.search_future
+        self.search_future = None
+        try:
+            self.search_index = search_future.result()
+        except Exception as error:
+            IO.warning("Could not build the search index: %s" % error)
+            return None
+
+        self.search_text_changed(self.search_le.text())
+
+        return True
+
+    def search_text_changed(self, text):
+        """
+        Lists the nodes matching what was typed.
+
+        :param text: The search text.
+        :type: str
+        """
+        self.search_lw.clear()
+        if not self.search_index:
+            return None
+
+        self.search_lw.addItems(self.search_index.find(text,
+                                                       limit=self.MAX_SEARCH_RESULTS))
+
+    def search_result_selected(self, path):
+        """
+        Selects a search result in every pane. It's selected as it is in the first
+        pane that has it, the others follow from there.
+
+        :param path: The path of the result.
+        :type: str
+        """
+        if not path:
+            return None
+
+        for curr_disc in self.asset_disc_list:
+            if path in self.tree_items.get(curr_disc, {}):
+                self.select_path(path, curr_disc)
                 return True
 
-    def _reveal_hidden(self, parent):
+        return None
+
+    def tree_item_changed(self, disc, current, previous):
         """
-        Recursively go through the hierarchy finding any parent, unhiding it, then
-        going into the children and unhiding all of them.
+        Selects the same node in the other panes when one is selected.
+
+        :param disc: The discipline of the pane that was clicked.
+        :type: str
+
+        :param current: The item selected.
+        :type: QtWidgets.QTreeWidgetItem
+
+        :param previous: The item selected before.
+        :type: QtWidgets.QTreeWidgetItem
         """
-        # The base case. This is the leaf so unhide it if it's hidden.
-        if not parent.childCount() > 0:
-                parent.setHidden(False)
+        if self.syncing or current is None:
+            return None
 
-        # The parent has children, so unhide this then dive into the children to unhide.
-        else:
-            parent.setHidden(False)
-            child_count = parent.childCount()
-            for child_index in range(child_count):
-                self._reveal_hidden(parent.child(child_index))
+        self.select_path(current.data(0, QtCore.Qt.UserRole), disc)
+
+    def select_path(self, path, disc):
+        """
+        Selects a node in every pane. The search index says where the node went in
+        each discipline, and the item is looked up by its path, so no tree gets
+        walked.
+
+        :param path: The node path.
+        :type: str
+
+        :param disc: The discipline the path is from.
+        :type: str
+        """
+        if not self.search_index:
+            return None
+
+        self.syncing = True
+        try:
+            for curr_disc in self.asset_disc_list:
+                target = self.search_index.find_counterpart(path, disc, curr_disc)
+                item = self._get_tree_item(curr_disc, target)
+                if item is None:
+                    continue
+                tree_view = self.tree_views[curr_disc]
+                tree_view.setCurrentItem(item)
+                tree_view.scrollToItem(item)
+        finally:
+            self.syncing = False
+
+        return True
+
+    def _get_tree_item(self, disc, path):
+        """
+        Gets the tree item of a path, or of the closest parent that's in the tree and
+        not hidden by isolating.
+
+        :param disc: The discipline of the tree view.
+        :type: str
+
+        :param path: The node path.
+        :type: str
+
+        :return: The item, None if nothing above it is shown either.
+        :type: QtWidgets.QTreeWidgetItem
+        """
+        tree_items = self.tree_items.get(disc, {})
+        while path:
+            item = tree_items.get(path)
+            if item is not None and not self._is_hidden(item):
+                return item
+            path = path.rsplit("|", 1)[0]
+
+        return None
+
+    def _is_hidden(self, item):
+        """
+        :param item: The tree item.
+        :type: QtWidgets.QTreeWidgetItem
+
+        :return: Whether the item or anything above it is hidden.
+        :type: bool
+        """
+        while item is not None:
+            if item.isHidden():
+                return True
+            item = item.parent()
+
+        return False
 
     def set_icon(self):
         """
         Sets the icon of rigging and surfacing after they've populated their views.
         Passing means no fails - so green check mark.
         Unable to find a rigging or surfacing - warning mark.
-        Fails present, meaning modeling was missing - red X.
+        Fails present, meaning modeling was missing or its geometry changed - red X.
         """
-        # Gets the rig and surface fails from the check utility.
-        rig_fails = self.hier_check_util.get_rig_fail()
-        surface_fails = self.hier_check_util.get_surface_fail()
         read_hier = self.hier_check_util.get_read_hiers()
 
-        # First check if we read anything for rigging, then checks if rigging failed.
-        if not read_hier[Discipline.RIG.name]:
-            self.rig_icon_lbl.setPixmap(self.icon_paths[1])
-        elif not rig_fails:
-            self.rig_icon_lbl.setPixmap(self.icon_paths[0])
-        else:
-            self.rig_icon_lbl.setPixmap(self.icon_paths[2])
-
-        # First check if we read anything for surfacing, then checks if surfacing failed.
-        if not read_hier[Discipline.SURFACE.name]:
-            self.surface_icon_lbl.setPixmap(self.icon_paths[1])
-        elif not surface_fails:
-            self.surface_icon_lbl.setPixmap(self.icon_paths[0])
-        else:
-            self.surface_icon_lbl.setPixmap(self.icon_paths[2])
\ No newline at end of file
+        # First check if we read anything for the discipline, then checks if it
+        # failed.
+        for curr_disc in self.asset_disc_list[1:]:
+            icon_lbl = self.icon_lbls[curr_disc]
+            if not read_hier[curr_disc]:
+                icon_lbl.setPixmap(self.icon_paths[1])
+            elif not self.hier_check_util.get_fail(curr_disc) and \
+                    not self.hier_check_util.get_geo_changes(curr_disc):
+                icon_lbl.setPixmap(self.icon_paths[0])
+            else:
+                icon_lbl.setPixmap(self.icon_paths[2])
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# SETMODE 777
+
+# ----------------------------------------------------------------------------------------#
+# ------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Andy Tran - axt170020
+
+:synopsis:
+    Keeps every version of an asset's hierarchy snapshots.
+
+:description:
+    The hierarchy text files get overwritten or deleted, so there's no way to tell
+    when a hierarchy drifted. This keeps a history for each asset and discipline.
+    Every version is saved as the nodes added and removed since the version before
+    it, with a full copy every KEYFRAME_INTERVAL versions so getting any version
+    back only replays a few deltas. Any two versions, even from different
+    disciplines, can then be diffed without opening the old Maya files.
+
+    The files look like this:
+        <root_dir>/<asset>/<disc>/index.json
+        <root_dir>/<asset>/<disc>/v0001.json.gz
+
+:applications:
+    None, this is plain Python.
+
+:see_also:
+    hierarchy_check_diff.py
+    hierarchy_check_utils.py
+"""
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from collections import OrderedDict
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+# External
+from maya_tools.utils.hierarchy_check_diff import diff_hierarchies
+
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- CLASSES --#
+
+class SnapshotHistory(object):
+    """
+    The version history of the hierarchy snapshots, stored as deltas.
+    """
+    KEYFRAME_INTERVAL = 10
+    CACHE_SIZE        = 32
+    INDEX_NAME        = "index.json"
+
+    def __init__(self, root_dir=None):
+        """
+        :param root_dir: The directory holding the histories of every asset.
+        :type: str
+        """
+        self.root_dir = root_dir
+
+        # Rebuilt versions, (asset, disc, version) to the nodes, so walking through
+        # versions in order only applies one delta each time.
+        self.cache = OrderedDict()
+        self.lock  = threading.Lock()
+
+    def get_history_dir(self, asset, disc):
+        """
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline.
+        :type: str
+
+        :return: The directory holding the asset's history for the discipline.
+        :type: str
+        """
+        return os.path.join(self.root_dir, asset, disc)
+
+    def list_versions(self, asset=None, disc=None):
+        """
+        Gets the recorded versions.
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline.
+        :type: str
+
+        :return: A dictionary for each version, oldest first, ie.
+                 {"version": 3, "keyframe": False, "hash": "...", "time": 1700000000.0,
+                  "source": "...asset_hier.txt", "node_count": 120}
+        :type: list
+        """
+        index_path = os.path.join(self.get_history_dir(asset, disc), self.INDEX_NAME)
+        if not os.path.exists(index_path):
+            return []
+
+        with open(index_path, "r") as file1:
+            return json.load(file1)
+
+    def get_latest_version(self, asset=None, disc=None):
+        """
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline.
+        :type: str
+
+        :return: The newest version number, None if there's no history.
+        :type: int
+        """
+        versions = self.list_versions(asset, disc)
+
+        return versions[-1]["version"] if versions else None
+
+    def add_version(self, asset=None, disc=None, nodes=None, source=None):
+        """
+        Records a snapshot as the next version. If it's the same as the newest
+        version, nothing is added.
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline.
+        :type: str
+
+        :param nodes: The normalized node paths.
+        :type: list
+
+        :param source: Where the snapshot came from, usually the text file.
+        :type: str
+
+        :return: The version the snapshot is stored as.
+        :type: int
+        """
+        nodes = sorted(set(nodes or []))
+        content_hash = hashlib.md5("\n".join(nodes).encode("utf-8")).hexdigest()
+
+        with self.lock:
+            versions = self.list_versions(asset, disc)
+            if versions and versions[-1]["hash"] == content_hash:
+                return versions[-1]["version"]
+
+            history_dir = self.get_history_dir(asset, disc)
+            if not os.path.isdir(history_dir):
+                os.makedirs(history_dir)
+
+            # Keyframes keep every node, the rest only what changed since the last one.
+            version = versions[-1]["version"] + 1 if versions else 1
+            keyframe = not versions or (version - 1) % self.KEYFRAME_INTERVAL == 0
+            if keyframe:
+                data = {"nodes": nodes}
+            else:
+                previous = set(self._get_nodes(asset, disc, versions[-1]["version"],
+                                               versions))
+                current = set(nodes)
+                data = {"added": sorted(current - previous),
+                        "removed": sorted(previous - current)}
+
+            self._write_json(self._get_version_path(asset, disc, version), data,
+                             compress=True)
+            versions.append({"version": version,
+                             "keyframe": keyframe,
+                             "hash": content_hash,
+                             "time": time.time(),
+                             "source": source,
+                             "node_count": len(nodes)})
+            self._write_json(os.path.join(history_dir, self.INDEX_NAME), versions)
+            self._cache_nodes((asset, disc, version), nodes)
+
+        return version
+
+    def get_version(self, asset=None, disc=None, version=None):
+        """
+        Rebuilds a version of the snapshot.
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline.
+        :type: str
+
+        :param version: The version, the newest if not given.
+        :type: int
+
+        :return: The sorted node paths, None if there's no such version.
+        :type: list
+        """
+        versions = self.list_versions(asset, disc)
+        if not versions:
+            return None
+        if version is None:
+            version = versions[-1]["version"]
+        if not 1 <= version <= versions[-1]["version"]:
+            return None
+
+        return list(self._get_nodes(asset, disc, version, versions))
+
+    def diff_versions(self, asset=None, disc=None, version=None, other_version=None,
+                      other_disc=None):
+        """
+        Compares two versions, the first one sets the hierarchy like modeling does.
+        They can be from different disciplines, ie. modeling v3 against rigging v7.
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline of the first version.
+        :type: str
+
+        :param version: The first version, the newest if not given.
+        :type: int
+
+        :param other_version: The second version, the newest if not given.
+        :type: int
+
+        :param other_disc: The discipline of the second version, the same as the
+                           first if not given.
+        :type: str
+
+        :return: The comparison, None if either version doesn't exist.
+        :type: HierarchyDiff
+        """
+        other_disc = other_disc or disc
+        nodes = self.get_version(asset, disc, version)
+        other_nodes = self.get_version(asset, other_disc, other_version)
+        if nodes is None or other_nodes is None:
+            return None
+
+        return diff_hierarchies(nodes, other_nodes, discipline=other_disc)
+
+    def _get_nodes(self, asset, disc, version, versions):
+        """
+        Rebuilds a version from the closest keyframe before it, or the closest
+        version already in the cache.
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline.
+        :type: str
+
+        :param version: The version to rebuild.
+        :type: int
+
+        :param versions: The list from list_versions.
+        :type: list
+
+        :return: The node paths.
+        :type: list
+        """
+        cached = self.cache.get((asset, disc, version))
+        if cached is not None:
+            self.cache.move_to_end((asset, disc, version))
+            return cached
+
+        # Walk back to the first thing we can start from.
+        start = version
+        nodes = None
+        while start > 1 and not versions[start - 1]["keyframe"]:
+            if (asset, disc, start - 1) in self.cache:
+                nodes = set(self.cache[(asset, disc, start - 1)])
+                break
+            start -= 1
+        if nodes is None:
+            nodes = set(self._read_json(
+                self._get_version_path(asset, disc, start))["nodes"])
+            start += 1
+
+        # Then replay the deltas up to the version.
+        for curr_version in range(start, version + 1):
+            delta = self._read_json(self._get_version_path(asset, disc, curr_version))
+            nodes.difference_update(delta["removed"])
+            nodes.update(delta["added"])
+
+        nodes = sorted(nodes)
+        self._cache_nodes((asset, disc, version), nodes)
+
+        return nodes
+
+    def _cache_nodes(self, key, nodes):
+        """
+        Keeps a rebuilt version, dropping the oldest past CACHE_SIZE.
+
+        :param key: (asset, disc, version)
+        :type: tuple
+
+        :param nodes: The node paths.
+        :type: list
+        """
+        self.cache[key] = nodes
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+    def _get_version_path(self, asset, disc, version):
+        """
+        :return: The file of a version, ie. ".../v0003.json.gz".
+        :type: str
+        """
+        return os.path.join(self.get_history_dir(asset, disc),
+                            "v%04d.json.gz" % version)
+
+    def _read_json(self, file_path):
+        """
+        Reads a compressed version file.
+
+        :param file_path: The file.
+        :type: str
+
+        :return: What was saved.
+        :type: dict
+        """
+        with gzip.open(file_path, "rt") as file1:
+            return json.load(file1)
+
+    def _write_json(self, file_path, data, compress=False):
+        """
+        Writes json to a temp file and swaps it in, so a crash never leaves a half
+        written version or index.
+
+        :param file_path: The file.
+        :type: str
+
+        :param data: What to save.
+        :type: dict
+
+        :param compress: Gzip the file.
+        :type: bool
+        """
+        temp_path = "%s.%d.tmp" % (file_path, os.getpid())
+        opener = gzip.open if compress else open
+        with opener(temp_path, "wt") as file1:
+            json.dump(data, file1)
+        os.replace(temp_path, file_path)
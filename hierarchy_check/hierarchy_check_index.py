@@ -0,0 +1,506 @@
+#!/usr/bin/env python
+# SETMODE 777
+
+# ----------------------------------------------------------------------------------------#
+# ------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Andy Tran - axt170020
+
+:synopsis:
+    A SQLite index of the hierarchy snapshots and diff results of a project.
+
+:description:
+    HierarchyCheckUtil can record every snapshot it reads, the fingerprints and the
+    diff against modeling in here. Questions across a whole project, like "which
+    assets are missing ren_GRP in surfacing" or "which rigs changed since last
+    week", then become a single query instead of opening every asset in the GUI.
+    Snapshots that haven't changed since they were last recorded are skipped.
+
+:applications:
+    None, sqlite3 comes with Python.
+
+:see_also:
+    hierarchy_check_utils.py
+    hierarchy_check_diff.py
+"""
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import hashlib
+import sqlite3
+import threading
+import time
+
+# External
+from maya_tools.utils.hierarchy_check_diff import NodeStatus, split_path
+
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- CLASSES --#
+
+class HierarchyIndex(object):
+    """
+    The SQLite database holding the snapshots and diff results.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id           INTEGER PRIMARY KEY,
+            project      TEXT NOT NULL,
+            asset        TEXT NOT NULL,
+            discipline   TEXT NOT NULL,
+            source       TEXT,
+            content_hash TEXT NOT NULL,
+            node_count   INTEGER NOT NULL,
+            fingerprint_hash TEXT,
+            updated      REAL NOT NULL,
+            changed      REAL NOT NULL,
+            UNIQUE (project, asset, discipline)
+        );
+        CREATE INDEX IF NOT EXISTS snapshots_changed
+            ON snapshots (project, discipline, changed);
+
+        CREATE TABLE IF NOT EXISTS nodes (
+            snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+            path        TEXT NOT NULL,
+            parent      TEXT NOT NULL,
+            leaf        TEXT NOT NULL,
+            depth       INTEGER NOT NULL,
+            PRIMARY KEY (snapshot_id, path)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS nodes_leaf ON nodes (leaf);
+        CREATE INDEX IF NOT EXISTS nodes_path ON nodes (path);
+
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            snapshot_id  INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+            path         TEXT NOT NULL,
+            vertex_count INTEGER,
+            face_count   INTEGER,
+            uv_count     INTEGER,
+            xmin REAL, xmax REAL, ymin REAL, ymax REAL, zmin REAL, zmax REAL,
+            point_hash   TEXT,
+            PRIMARY KEY (snapshot_id, path)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS diff_results (
+            project    TEXT NOT NULL,
+            asset      TEXT NOT NULL,
+            discipline TEXT NOT NULL,
+            path       TEXT NOT NULL,
+            leaf       TEXT NOT NULL,
+            status     TEXT NOT NULL,
+            detail     TEXT,
+            updated    REAL NOT NULL,
+            PRIMARY KEY (project, asset, discipline, path)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS diff_results_leaf
+            ON diff_results (project, discipline, leaf, status);
+        CREATE INDEX IF NOT EXISTS diff_results_status
+            ON diff_results (project, discipline, status);
+    """
+
+    FAIL_STATUSES = (NodeStatus.MISSING, NodeStatus.MOVED)
+
+    def __init__(self, db_path=None):
+        """
+        :param db_path: The database file, made if it doesn't exist. ":memory:" keeps
+                        it in memory.
+        :type: str
+        """
+        self.db_path = db_path or ":memory:"
+
+        # The prefetcher records from its own threads, so share the connection behind
+        # a lock instead of tying it to one thread.
+        self.lock       = threading.Lock()
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        with self.lock, self.connection:
+            self.connection.executescript(self.SCHEMA)
+
+            # Databases made before the fingerprints were hashed don't have the column.
+            columns = [row[1] for row in \
+                       self.connection.execute("PRAGMA table_info(snapshots)")]
+            if "fingerprint_hash" not in columns:
+                self.connection.execute("ALTER TABLE snapshots "
+                                        "ADD COLUMN fingerprint_hash TEXT")
+
+    def close(self):
+        """
+        Closes the database.
+        """
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record_snapshot(self, project=None, asset=None, disc=None, nodes=None,
+                        source=None, mesh_fingerprints=None):
+        """
+        Records the nodes of a snapshot. The nodes and the fingerprints are hashed
+        separately, so only the part that changed since last time is rewritten. If
+        neither did, only the updated time is touched. Meshes that kept their paths
+        but changed geometry count as a change.
+
+        :param project: The project name.
+        :type: str
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline of the snapshot.
+        :type: str
+
+        :param nodes: The normalized node paths.
+        :type: list
+
+        :param source: Where the snapshot came from, usually the text file.
+        :type: str
+
+        :param mesh_fingerprints: The fingerprints that go with the snapshot. Without
+                                  them, the recorded ones are kept if the nodes didn't
+                                  change.
+        :type: GeometryFingerprints
+
+        :return: Whether anything changed since the last time it was recorded.
+        :type: bool
+        """
+        nodes = list(nodes or [])
+        content_hash = hashlib.md5("\n".join(nodes).encode("utf-8")).hexdigest()
+        now = time.time()
+
+        # The rows are made without the snapshot id so they can be hashed first.
+        fingerprint_rows = None
+        fingerprint_hash = None
+        if mesh_fingerprints is not None:
+            fingerprint_rows = list(self._iter_fingerprint_rows(None, mesh_fingerprints))
+            fingerprint_hash = hashlib.md5(repr([fingerprint_row[1:] for fingerprint_row \
+                                                 in fingerprint_rows]).encode("utf-8")
+                                           ).hexdigest()
+
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT id, content_hash, fingerprint_hash FROM snapshots "
+                "WHERE project = ? AND asset = ? AND discipline = ?",
+                (project, asset, disc)).fetchone()
+
+            nodes_changed = not row or row[1] != content_hash
+            fingerprints_changed = fingerprint_rows is not None and \
+                (not row or row[2] != fingerprint_hash)
+            if not nodes_changed and not fingerprints_changed:
+                self.connection.execute("UPDATE snapshots SET updated = ?, source = ? "
+                                        "WHERE id = ?", (now, source, row[0]))
+                return False
+
+            # Fingerprints of nodes that changed don't hold anymore, unless new ones
+            # came with them.
+            if fingerprint_rows is None:
+                fingerprint_hash = row[2] if row and not nodes_changed else None
+
+            if row:
+                snapshot_id = row[0]
+                self.connection.execute(
+                    "UPDATE snapshots SET source = ?, content_hash = ?, node_count = ?, "
+                    "fingerprint_hash = ?, updated = ?, changed = ? WHERE id = ?",
+                    (source, content_hash, len(nodes), fingerprint_hash, now, now,
+                     snapshot_id))
+                if nodes_changed:
+                    self.connection.execute("DELETE FROM nodes WHERE snapshot_id = ?",
+                                            (snapshot_id,))
+                if nodes_changed or fingerprints_changed:
+                    self.connection.execute("DELETE FROM fingerprints "
+                                            "WHERE snapshot_id = ?", (snapshot_id,))
+            else:
+                snapshot_id = self.connection.execute(
+                    "INSERT INTO snapshots (project, asset, discipline, source, "
+                    "content_hash, node_count, fingerprint_hash, updated, changed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (project, asset, disc, source, content_hash, len(nodes),
+                     fingerprint_hash, now, now)).lastrowid
+
+            if nodes_changed:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO nodes (snapshot_id, path, parent, leaf, "
+                    "depth) VALUES (?, ?, ?, ?, ?)",
+                    ((snapshot_id, path) + split_path(path) + (path.count("|"),) \
+                     for path in nodes))
+
+            if fingerprint_rows:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO fingerprints VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((snapshot_id,) + fingerprint_row[1:] \
+                     for fingerprint_row in fingerprint_rows))
+
+        return True
+
+    def _iter_fingerprint_rows(self, snapshot_id, mesh_fingerprints):
+        """
+        Turns the fingerprint columns into table rows. The point hash doesn't fit in
+        SQLite's signed integers, so it's kept as hex.
+
+        :param snapshot_id: The snapshot the fingerprints belong to.
+        :type: int
+
+        :param mesh_fingerprints: The fingerprints.
+        :type: GeometryFingerprints
+        """
+        for row in range(len(mesh_fingerprints)):
+            yield ((snapshot_id, str(mesh_fingerprints.paths[row]),
+                    int(mesh_fingerprints.vertex_count[row]),
+                    int(mesh_fingerprints.face_count[row]),
+                    int(mesh_fingerprints.uv_count[row])) +
+                   tuple(float(value) for value in mesh_fingerprints.bbox[row]) +
+                   ("%016x" % int(mesh_fingerprints.point_hash[row]),))
+
+    def record_diff(self, project=None, asset=None, diff=None, geo_changes=None):
+        """
+        Replaces the diff results of an asset's discipline. Only nodes that didn't
+        match are kept, so a clean asset takes no rows.
+
+        :param project: The project name.
+        :type: str
+
+        :param asset: The asset name.
+        :type: str
+
+        :param diff: The comparison of the discipline to modeling.
+        :type: HierarchyDiff
+
+        :param geo_changes: The changed fingerprint fields for each path.
+        :type: dict
+        """
+        now = time.time()
+        rows = []
+        for path in diff.status:
+            status = diff.get_status(path)
+            detail = diff.moved.get(path) or diff.get_rename(path) or \
+                diff.get_rename_source(path)
+            rows.append((project, asset, diff.discipline, path, split_path(path)[1],
+                         status, detail, now))
+        for path in geo_changes or {}:
+            rows.append((project, asset, diff.discipline, path, split_path(path)[1],
+                         "geometry", ",".join(geo_changes[path]), now))
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM diff_results "
+                "WHERE project = ? AND asset = ? AND discipline = ?",
+                (project, asset, diff.discipline))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO diff_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+
+    def delete_snapshot(self, project=None, asset=None, disc=None):
+        """
+        Forgets the snapshot of an asset's discipline, its nodes and fingerprints go
+        with it.
+
+        :param project: The project name.
+        :type: str
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline of the snapshot.
+        :type: str
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM snapshots "
+                "WHERE project = ? AND asset = ? AND discipline = ?",
+                (project, asset, disc))
+
+    def delete_diff(self, project=None, asset=None, disc=None):
+        """
+        Forgets the diff results of an asset's discipline.
+
+        :param project: The project name.
+        :type: str
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline compared to modeling.
+        :type: str
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM diff_results "
+                "WHERE project = ? AND asset = ? AND discipline = ?",
+                (project, asset, disc))
+
+    def record_util(self, hier_check_util=None):
+        """
+        Records everything a HierarchyCheckUtil read and matched for its asset. The
+        disciplines it has no nodes or no diff for are cleared, so an older check
+        doesn't linger, ie. when the txt was deleted or modeling came back empty.
+
+        :param hier_check_util: The util after get_info.
+        :type: HierarchyCheckUtil
+        """
+        asset_obj = hier_check_util.asset_obj
+        project = asset_obj.project_name
+
+        for curr_disc in hier_check_util.asset_disc_list:
+            if hier_check_util.read_hier.get(curr_disc):
+                self.record_snapshot(project, asset_obj.name, curr_disc,
+                                     hier_check_util.read_hier[curr_disc],
+                                     source=hier_check_util.text_file_paths.get(
+                                         curr_disc),
+                                     mesh_fingerprints=\
+                                         hier_check_util.fingerprints.get(curr_disc))
+            else:
+                self.delete_snapshot(project, asset_obj.name, curr_disc)
+
+            if curr_disc in hier_check_util.diffs:
+                self.record_diff(project, asset_obj.name,
+                                 hier_check_util.diffs[curr_disc],
+                                 geo_changes=hier_check_util.get_geo_changes(curr_disc))
+            else:
+                self.delete_diff(project, asset_obj.name, curr_disc)
+
+    def find_assets_failing(self, project=None, disc=None, node=None):
+        """
+        Finds the assets where a node from modeling is missing or moved in a
+        discipline, ie. which assets are missing "ren_GRP" in surfacing.
+
+        :param project: The project name.
+        :type: str
+
+        :param disc: The discipline compared to modeling.
+        :type: str
+
+        :param node: The leaf name, or the full path if it starts with "|".
+        :type: str
+
+        :return: The asset names.
+        :type: list
+        """
+        column = "path" if node.startswith("|") else "leaf"
+        query = ("SELECT DISTINCT asset FROM diff_results "
+                 "WHERE project = ? AND discipline = ? AND %s = ? "
+                 "AND status IN (?, ?) ORDER BY asset" % column)
+
+        return self._fetch_column(query, (project, disc, node) + self.FAIL_STATUSES)
+
+    def find_failing_assets(self, project=None, disc=None):
+        """
+        Finds every asset that fails the check in a discipline.
+
+        :param project: The project name.
+        :type: str
+
+        :param disc: The discipline compared to modeling.
+        :type: str
+
+        :return: The asset names.
+        :type: list
+        """
+        query = ("SELECT DISTINCT asset FROM diff_results "
+                 "WHERE project = ? AND discipline = ? AND status IN (?, ?) "
+                 "ORDER BY asset")
+
+        return self._fetch_column(query, (project, disc) + self.FAIL_STATUSES)
+
+    def find_changed_since(self, project=None, since=None, disc=None):
+        """
+        Finds the snapshots whose hierarchy changed since a time, ie. which rigs
+        changed since last week.
+
+        :param project: The project name.
+        :type: str
+
+        :param since: The time, in seconds since the epoch.
+        :type: float
+
+        :param disc: Only look at this discipline.
+        :type: str
+
+        :return: (asset, discipline, changed time) for each changed snapshot.
+        :type: list
+        """
+        query = "SELECT asset, discipline, changed FROM snapshots " \
+                "WHERE project = ? AND changed >= ?"
+        args = (project, since)
+        if disc:
+            query += " AND discipline = ?"
+            args += (disc,)
+
+        with self.lock:
+            return self.connection.execute(query + " ORDER BY changed DESC",
+                                           args).fetchall()
+
+    def find_assets_with_node(self, project=None, disc=None, node=None):
+        """
+        Finds the assets whose snapshot has a node.
+
+        :param project: The project name.
+        :type: str
+
+        :param disc: The discipline of the snapshots.
+        :type: str
+
+        :param node: The leaf name, or the full path if it starts with "|".
+        :type: str
+
+        :return: The asset names.
+        :type: list
+        """
+        column = "path" if node.startswith("|") else "leaf"
+        query = ("SELECT DISTINCT snapshots.asset FROM nodes "
+                 "JOIN snapshots ON snapshots.id = nodes.snapshot_id "
+                 "WHERE nodes.%s = ? AND snapshots.project = ? "
+                 "AND snapshots.discipline = ? ORDER BY snapshots.asset" % column)
+
+        return self._fetch_column(query, (node, project, disc))
+
+    def get_diff_results(self, project=None, asset=None, disc=None):
+        """
+        Gets the recorded diff results of an asset.
+
+        :param project: The project name.
+        :type: str
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: Only get this discipline.
+        :type: str
+
+        :return: (discipline, path, status, detail) for each node that didn't match.
+        :type: list
+        """
+        query = "SELECT discipline, path, status, detail FROM diff_results " \
+                "WHERE project = ? AND asset = ?"
+        args = (project, asset)
+        if disc:
+            query += " AND discipline = ?"
+            args += (disc,)
+
+        with self.lock:
+            return self.connection.execute(query + " ORDER BY discipline, path",
+                                           args).fetchall()
+
+    def _fetch_column(self, query, args):
+        """
+        Runs a query and returns its first column.
+
+        :param query: The SQL.
+        :type: str
+
+        :param args: The query arguments.
+        :type: tuple
+
+        :return: The values of the first column.
+        :type: list
+        """
+        with self.lock:
+            return [row[0] for row in self.connection.execute(query, args)]
@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+# SETMODE 777
+
+# ----------------------------------------------------------------------------------------#
+# ------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Andy Tran - axt170020
+
+:synopsis:
+    Gets the hierarchies of an asset ready before the user asks for them.
+
+:description:
+    When an asset is picked in the GUI, the prefetcher starts resolving the paths,
+    reading the existing text files and diffing them in the background, for that
+    asset and the ones next to it in the list. Anything missing a text file gets
+    queued for a maya batch behind the reads. Picking something else cancels
+    whatever hasn't started yet, so by the time "Get Hierarchy" is pressed the
+    results are usually already there.
+
+    Only one maya batch runs at a time, and the selected asset always gets it first.
+    The neighbors' maya batches wait until the selected asset has been read, so one
+    of them can't take the worker while the selected asset still needs it. Changing
+    the selection kills the maya batch that's running, so nothing waits behind a
+    neighbor that isn't wanted anymore.
+
+:applications:
+    Maya, the same as HierarchyCheckUtil.
+
+:see_also:
+    hierarchy_check_utils.py
+    hierarchy_check_gui.py
+"""
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+import threading
+
+# External
+from gen_utils.utils import IO
+from maya_tools.utils.hierarchy_check_utils import HierarchyCheckUtil
+
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- CLASSES --#
+
+class SnapshotPrefetcher(object):
+    """
+    Reads and diffs hierarchies in background threads. The reads are cheap and run a
+    few at a time, maya batches are expensive and run one at a time after the reads,
+    the selected asset first.
+    """
+    MAX_READS       = 2
+    MAX_EXTRACTIONS = 1  # Killing a maya batch on Windows kills all of them.
+    NEIGHBORS       = 1
+    MAX_RESULTS     = 16
+
+    def __init__(self, context=None, fingerprint=False, index=None, disciplines=None,
+                 scope=None):
+        """
+        :param context: The pipe context handed to each HierarchyCheckUtil.
+        :type: PipeContext
+
+        :param fingerprint: Whether the utils compare geometry fingerprints too.
+        :type: bool
+
+        :param index: The HierarchyIndex the utils record into.
+        :type: HierarchyIndex
+
+        :param disciplines: The disciplines the utils check, modeling first.
+        :type: list
+
+        :param scope: The part of the hierarchy the utils check.
+        :type: ExtractionScope
+        """
+        self.context     = context
+        self.fingerprint = fingerprint
+        self.index       = index
+        self.disciplines = disciplines
+        self.scope       = scope
+
+        self.read_pool    = ThreadPoolExecutor(max_workers=self.MAX_READS)
+        self.extract_pool = ThreadPoolExecutor(max_workers=self.MAX_EXTRACTIONS)
+
+        # Bumped every time the selection changes, anything started under an older
+        # generation stops at the next step.
+        self.generation = 0
+        self.lock       = threading.Lock()
+        self.tasks      = []
+
+        # The assets waiting on a maya batch, and the selected asset that goes before
+        # the others. The condition wakes the maya batch worker when either changes.
+        self.extract_queue = []
+        self.selected      = None
+        self.extract_ready = threading.Condition(self.lock)
+
+        # The util whose maya batches are running, cancelling stops it.
+        self.extracting = None
+
+        # Asset name to the Future that resolves to its finished HierarchyCheckUtil and
+        # the modified times of the text files it was read from, or None.
+        self.results = OrderedDict()
+
+    def schedule(self, project=None, asset_name=None, asset_names=None):
+        """
+        Starts prefetching an asset and its neighbors. Anything still queued for the
+        last selection is cancelled.
+
+        :param project: The SG project obj the assets belong to.
+        :type: SG Project Obj
+
+        :param asset_name: The selected asset.
+        :type: str
+
+        :param asset_names: All the assets in the order the GUI lists them, used to
+                            find the neighbors.
+        :type: list
+        """
+        self.cancel()
+        if not project or not asset_name:
+            return None
+
+        # The selected asset goes first so it's read before the neighbors.
+        names = [asset_name]
+        if asset_names and asset_name in asset_names:
+            index = asset_names.index(asset_name)
+            for offset in range(1, self.NEIGHBORS + 1):
+                names += [asset_names[curr_index] for curr_index in \
+                          (index + offset, index - offset) \
+                          if 0 <= curr_index < len(asset_names)]
+
+        # Anything done whose text files changed since, ie. after a republish, gets
+        # prefetched again. Checked before locking since the files are on the network.
+        with self.lock:
+            existing = dict((name, self.results.get(name)) for name in names)
+        outdated = [name for name, result in existing.items() \
+                    if result is not None and result.done() and not self._is_fresh(result)]
+
+        with self.lock:
+            generation = self.generation
+            self.selected = asset_name
+            for name in names:
+                # Leave anything that's already done or on its way alone.
+                if name in self.results and not self.results[name].cancelled() and \
+                        not (name in outdated and self.results[name] is existing[name]):
+                    self.results.move_to_end(name)
+                    continue
+                self.results[name] = Future()
+                self.tasks.append(self.read_pool.submit(self._read, generation, project,
+                                                        name, self.results[name]))
+            self._trim()
+
+        return True
+
+    def get(self, asset_name=None, wait=False):
+        """
+        Takes the prefetched result for an asset. It's removed from the prefetcher so
+        asking again later reads the files fresh.
+
+        :param asset_name: The asset.
+        :type: str
+
+        :param wait: Wait for the asset if it's still being read or extracted.
+        :type: bool
+
+        :return: The util with the hierarchies read and matched, None if there's
+                 nothing ready or the selection changed while it was on its way.
+        :type: HierarchyCheckUtil
+        """
+        with self.lock:
+            result = self.results.get(asset_name)
+            if result is None or (not wait and not result.done()):
+                return None
+
+        result.result()
+        with self.lock:
+            if self.results.get(asset_name) is result:
+                del self.results[asset_name]
+
+        # The text files changed after it was read, so the diff is outdated.
+        if not self._is_fresh(result):
+            return None
+
+        return result.result()[0]
+
+    def discard(self, asset_name=None):
+        """
+        Forgets the result for an asset, ie. after its text files were deleted.
+
+        :param asset_name: The asset.
+        :type: str
+        """
+        with self.lock:
+            result = self.results.pop(asset_name, None)
+        if result is not None:
+            self._finish(result, None)
+
+    def cancel(self, clear=False):
+        """
+        Cancels everything that hasn't started. Reads that already started finish,
+        but nothing after them runs. A running maya batch is killed, so the next
+        selection doesn't wait behind it.
+
+        :param clear: Also forget the results that are already done, ie. when the
+                      project changes.
+        :type: bool
+        """
+        with self.lock:
+            self.generation += 1
+            for task in self.tasks:
+                task.cancel()
+            self.tasks = [task for task in self.tasks if not task.done()]
+            self.extract_queue = []
+            self.selected = None
+            self.extract_ready.notify_all()
+            if self.extracting is not None:
+                self.extracting.stop()
+
+            # Whatever didn't finish has to be prefetched again next time.
+            for name in list(self.results):
+                if not self.results[name].done():
+                    self.results.pop(name).set_result(None)
+                elif clear:
+                    del self.results[name]
+
+    def shutdown(self):
+        """
+        Cancels everything and stops the threads, for when the GUI closes.
+        """
+        self.cancel(clear=True)
+        self.read_pool.shutdown(wait=False)
+        self.extract_pool.shutdown(wait=False)
+
+    def _is_stale(self, generation):
+        """
+        :param generation: The generation the work was started under.
+        :type: int
+
+        :return: Whether the selection changed since.
+        :type: bool
+        """
+        return generation != self.generation
+
+    def _get_mtimes(self, util):
+        """
+        Gets the modified times of the text files a util was read from. The full ones
+        are included for scoped utils, since a newer full one outdates the scoped one.
+
+        :param util: The finished util.
+        :type: HierarchyCheckUtil
+
+        :return: The modified time of each text file, None if it doesn't exist.
+        :type: dict
+        """
+        mtimes = {}
+        for disc in util.asset_disc_list:
+            for path in set([util.get_text_file_path(disc),
+                             util.get_text_file_path(disc, scoped=False)]):
+                mtimes[path] = os.path.getmtime(path) if os.path.exists(path) else None
+
+        return mtimes
+
+    def _is_fresh(self, result):
+        """
+        :param result: A finished Future from results.
+        :type: concurrent.futures.Future
+
+        :return: Whether it has a util and none of its text files changed, showed up
+                 or went away since it was read.
+        :type: bool
+        """
+        if result.result() is None:
+            return False
+
+        util, mtimes = result.result()
+        try:
+            return self._get_mtimes(util) == mtimes
+        except Exception:
+            return False
+
+    def _finish(self, result, util):
+        """
+        Resolves an asset's Future, unless cancelling already did.
+
+        :param result: The Future handed out for the asset.
+        :type: concurrent.futures.Future
+
+        :param util: The finished util, or None if it didn't work out.
+        :type: HierarchyCheckUtil
+        """
+        value = (util, self._get_mtimes(util)) if util else None
+        with self.lock:
+            if not result.done():
+                result.set_result(value)
+            self.extract_ready.notify_all()
+
+    def _trim(self):
+        """
+        Drops the oldest finished results past MAX_RESULTS.
+        """
+        for name in list(self.results):
+            if len(self.results) <= self.MAX_RESULTS:
+                break
+            if self.results[name].done():
+                del self.results[name]
+
+    def _read(self, generation, project, asset_name, result):
+        """
+        Resolves the paths and reads the text files that already exist. If any are
+        missing, a maya batch gets queued for them.
+
+        :param generation: The generation the work was started under.
+        :type: int
+
+        :param project: The SG project obj.
+        :type: SG Project Obj
+
+        :param asset_name: The asset.
+        :type: str
+
+        :param result: The Future to resolve with the util.
+        :type: concurrent.futures.Future
+        """
+        if self._is_stale(generation):
+            return None
+
+        # Anything going wrong in here shouldn't leave someone waiting on the result.
+        try:
+            asset_obj = project.get_asset(asset_name)
+            if not asset_obj or not asset_obj.is_asset:
+                self._finish(result, None)
+                return None
+
+            util = HierarchyCheckUtil(context=self.context, fingerprint=self.fingerprint,
+                                      index=self.index, disciplines=self.disciplines,
+                                      scope=self.scope)
+            util.set_asset_obj(asset_obj)
+            util.get_maya_files()
+            text_file_paths = util.check_for_text_files(create=False)
+
+            # Only bother with a maya batch if there's a maya file to make the txt from.
+            to_create = [disc for disc in util.asset_disc_list \
+                         if not text_file_paths.get(disc) and \
+                         util.maya_file_paths.get(disc) and \
+                         os.path.exists(util.maya_file_paths[disc])]
+            if not to_create:
+                util.get_text_info()
+                matched = util.match_items()
+                util.update_index()
+                self._finish(result, util if matched else None)
+                return None
+        except Exception as error:
+            IO.warning("Could not prefetch %s: %s" % (asset_name, error))
+            self._finish(result, None)
+            return None
+
+        with self.lock:
+            if self._is_stale(generation):
+                return None
+            self.extract_queue.append((generation, asset_name, util, result))
+            self.tasks.append(self.extract_pool.submit(self._extract_next))
+            self.extract_ready.notify_all()
+
+    def _is_selected_read(self):
+        """
+        :return: Whether the selected asset is done reading, so it's known if it needs
+                 a maya batch. Call it with the lock held.
+        :type: bool
+        """
+        result = self.results.get(self.selected)
+        if result is None or result.done():
+            return True
+
+        return any(entry[1] == self.selected for entry in self.extract_queue)
+
+    def _extract_next(self):
+        """
+        Runs the next maya batch in the queue. The selected asset goes first, and the
+        others wait until the selected asset is read in case it needs the worker.
+        """
+        with self.lock:
+            while not self._is_selected_read():
+                self.extract_ready.wait(timeout=1)
+            if not self.extract_queue:
+                return None
+
+            entry = self.extract_queue[0]
+            for curr_entry in self.extract_queue:
+                if curr_entry[1] == self.selected:
+                    entry = curr_entry
+                    break
+            self.extract_queue.remove(entry)
+
+        self._extract(*entry)
+
+    def _extract(self, generation, asset_name, util, result):
+        """
+        Runs the maya batches for the missing text files, then reads and diffs.
+
+        :param generation: The generation the work was started under.
+        :type: int
+
+        :param asset_name: The asset.
+        :type: str
+
+        :param util: The util from _read, with its asset already set.
+        :type: HierarchyCheckUtil
+
+        :param result: The Future to resolve with the util.
+        :type: concurrent.futures.Future
+        """
+        # Checked with the lock held so cancel either sees this util or stops it
+        # from starting.
+        with self.lock:
+            if self._is_stale(generation):
+                return None
+            self.extracting = util
+
+        try:
+            util.clear_attrs()
+            value = (util, self._get_mtimes(util)) if util.get_info() else None
+        except Exception as error:
+            IO.warning("Could not prefetch %s: %s" % (asset_name, error))
+            value = None
+
+        # Let go of the util in the same step as resolving, so cancel can't stop a
+        # util that's already handed out. If cancel stopped it, the Future is already
+        # resolved to None and the GUI gets the info itself.
+        with self.lock:
+            self.extracting = None
+            if not result.done():
+                result.set_result(value)
+            self.extract_ready.notify_all()
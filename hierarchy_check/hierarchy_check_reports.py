@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# SETMODE 777
+
+# ----------------------------------------------------------------------------------------#
+# ------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Andy Tran - axt170020
+
+:synopsis:
+    Writes the hierarchy check results as JSON Lines or CSV.
+
+:description:
+    Each asset and discipline gets a summary row, then one row for every node that
+    didn't match. Rows are written and flushed as each asset finishes, so a project
+    wide run never holds more than one asset in memory and whatever reads the file
+    can follow along. The columns are fixed by REPORT_FIELDS and SCHEMA_VERSION
+    goes up if they ever change.
+
+:applications:
+    None, this is plain Python.
+
+:see_also:
+    hierarchy_check_utils.py
+    hierarchy_check_diff.py
+"""
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from abc import ABCMeta, abstractmethod
+import csv
+import json
+import os
+
+# External
+from maya_tools.utils.hierarchy_check_diff import NodeStatus
+
+
+# ----------------------------------------------------------------------------------------#
+# --------------------------------------------------------------------------- FUNCTIONS --#
+
+SCHEMA_VERSION = 1
+
+REPORT_FIELDS = ("schema_version", "project", "asset", "discipline", "reference",
+                 "path", "status", "detail")
+
+# The statuses of the summary rows, their path is empty.
+SUMMARY_PASS    = "pass"
+SUMMARY_FAIL    = "fail"
+SUMMARY_NO_DATA = "no_data"
+
+# The status of a node that kept its path but changed geometry.
+GEOMETRY_CHANGED = "geometry_changed"
+
+def iter_report_rows(hier_check_util=None):
+    """
+    Makes the report rows for the asset a HierarchyCheckUtil just checked, one
+    discipline at a time.
+
+    :param hier_check_util: The util after get_info.
+    :type: HierarchyCheckUtil
+
+    :return: The rows, as dictionaries with the REPORT_FIELDS keys.
+    :type: generator
+    """
+    asset_obj = hier_check_util.asset_obj
+    reference = hier_check_util.asset_disc_list[0]
+    base = {"schema_version": SCHEMA_VERSION,
+            "project": asset_obj.project_name,
+            "asset": asset_obj.name,
+            "reference": reference}
+
+    for curr_disc in hier_check_util.asset_disc_list[1:]:
+        diff = hier_check_util.get_diff(curr_disc)
+        geo_changes = hier_check_util.get_geo_changes(curr_disc)
+
+        # The summary row is all a publish gate needs to look at.
+        if diff is None:
+            status = SUMMARY_NO_DATA
+        elif diff.has_failures() or geo_changes:
+            status = SUMMARY_FAIL
+        else:
+            status = SUMMARY_PASS
+        yield _make_row(base, curr_disc, "", status,
+                        "%d failed" % len(diff.failures) if diff else "")
+        if diff is None:
+            continue
+
+        for path in diff.failures:
+            detail = diff.moved.get(path) if diff.get_status(path) == NodeStatus.MOVED \
+                else diff.get_rename(path)
+            yield _make_row(base, curr_disc, path, diff.get_status(path), detail)
+        for path in diff.extra:
+            yield _make_row(base, curr_disc, path, NodeStatus.EXTRA,
+                            diff.get_rename_source(path))
+        for path in sorted(geo_changes):
+            yield _make_row(base, curr_disc, path, GEOMETRY_CHANGED,
+                            ",".join(geo_changes[path]))
+
+def _make_row(base, disc, path, status, detail):
+    """
+    Fills in a report row.
+
+    :param base: The fields shared by every row of the asset.
+    :type: dict
+
+    :param disc: The discipline.
+    :type: str
+
+    :param path: The node path, empty for summary rows.
+    :type: str
+
+    :param status: The node or summary status.
+    :type: str
+
+    :param detail: Where the node moved or was renamed to, or the changed fields.
+    :type: str
+
+    :return: The row.
+    :type: dict
+    """
+    row = dict(base)
+    row["discipline"] = disc
+    row["path"] = path
+    row["status"] = status
+    row["detail"] = detail or ""
+
+    return row
+
+def get_report_writer(file_path=None):
+    """
+    Opens the writer that matches the file extension, ".csv", or ".jsonl" and
+    ".ndjson" for JSON Lines. A ".json" file would be expected to hold one JSON
+    document, so it isn't supported.
+
+    :param file_path: The report file.
+    :type: str
+
+    :return: The writer, None if the extension isn't supported.
+    :type: ReportWriter
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        return CsvReportWriter(file_path)
+    elif extension in (".jsonl", ".ndjson"):
+        return JsonLinesReportWriter(file_path)
+
+    return None
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- CLASSES --#
+
+class ReportWriter(metaclass=ABCMeta):
+    """
+    Writes report rows to a file or stream as they come in. The subclasses decide
+    how a row is written.
+    """
+    def __init__(self, output=None):
+        """
+        :param output: The file path to write to, or an open text stream.
+        :type: str
+        """
+        if isinstance(output, str):
+            self.stream = open(output, "w", newline="")
+            self.owns_stream = True
+        else:
+            self.stream = output
+            self.owns_stream = False
+
+        self.row_count = 0
+
+    @abstractmethod
+    def write_row(self, row):
+        """
+        Writes one row.
+
+        :param row: The row, with the REPORT_FIELDS keys.
+        :type: dict
+        """
+
+    def write_rows(self, rows):
+        """
+        Writes the rows one at a time and flushes at the end, so readers see every
+        finished asset.
+
+        :param rows: The rows, any iterable.
+        :type: generator
+
+        :return: How many rows were written.
+        :type: int
+        """
+        count = 0
+        for row in rows:
+            self.write_row(row)
+            count += 1
+        self.row_count += count
+        self.stream.flush()
+
+        return count
+
+    def close(self):
+        """
+        Closes the file if the writer opened it.
+        """
+        self.stream.flush()
+        if self.owns_stream:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class JsonLinesReportWriter(ReportWriter):
+    """
+    One JSON object per line, with the keys in REPORT_FIELDS order.
+    """
+    def write_row(self, row):
+        """
+        Writes one row.
+
+        :param row: The row, with the REPORT_FIELDS keys.
+        :type: dict
+        """
+        ordered = [(field, row.get(field, "")) for field in REPORT_FIELDS]
+        self.stream.write(json.dumps(dict(ordered)) + "\n")
+
+
+class CsvReportWriter(ReportWriter):
+    """
+    CSV with a header row of the REPORT_FIELDS.
+    """
+    def __init__(self, output=None):
+        """
+        :param output: The file path to write to, or an open text stream.
+        :type: str
+        """
+        ReportWriter.__init__(self, output)
+        self.writer = csv.DictWriter(self.stream, fieldnames=REPORT_FIELDS,
+                                     extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write_row(self, row):
+        """
+        Writes one row.
+
+        :param row: The row, with the REPORT_FIELDS keys.
+        :type: dict
+        """
+        self.writer.writerow(row)
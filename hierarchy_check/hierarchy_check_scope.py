@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# SETMODE 777
+
+# ----------------------------------------------------------------------------------------#
+# ------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Andy Tran - axt170020
+
+:synopsis:
+    Limits a hierarchy check to part of an asset.
+
+:description:
+    An ExtractionScope is a sub-root path, a maximum depth below it and node types
+    to include or exclude. Extraction only walks the scope, so the txt, the read and
+    the diff all shrink with it. Each scope has its own key, so scoped snapshots
+    are cached in their own files next to the full ones and never replace them.
+
+    The path and depth limits can also be applied to a full snapshot that was
+    already read. The type filters need Maya to look at the nodes, so they only
+    happen during extraction.
+
+:applications:
+    None, this is plain Python. The type filters are applied in
+    hierarchy_check_utils.py.
+
+:see_also:
+    hierarchy_check_utils.py
+"""
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import hashlib
+
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- CLASSES --#
+
+class ExtractionScope(object):
+    """
+    Which part of the hierarchy to extract and diff. An empty scope is the whole
+    asset.
+    """
+    # Separates the settings in a spec, none of them can have it in a value.
+    SPEC_SEPARATOR = ";"
+
+    def __init__(self, sub_root=None, max_depth=None, include_types=None,
+                 exclude_types=None):
+        """
+        :param sub_root: The normalized path to start from, ie.
+                         "|geometry_GRP|ren_GRP". The whole asset if not given.
+        :type: str
+
+        :param max_depth: How many levels below the sub-root to keep, 0 keeps only the
+                          sub-root. Every level if not given.
+        :type: int
+
+        :param include_types: Only keep nodes of these Maya types or with shapes of
+                              them, and the groups above them, ie. ["mesh"].
+        :type: list
+
+        :param exclude_types: Drop nodes of these Maya types or with shapes of them,
+                              and everything under them, ie. ["constraint"].
+        :type: list
+        """
+        self.sub_root      = sub_root.rstrip("|") if sub_root else None
+        self.max_depth     = max_depth
+        self.include_types = sorted(include_types or [])
+        self.exclude_types = sorted(exclude_types or [])
+
+    @classmethod
+    def parse(cls, spec=None):
+        """
+        Builds a scope back from get_spec.
+
+        :param spec: The spec, ie. "sub_root=|geometry_GRP|ren_GRP;max_depth=2".
+        :type: str
+
+        :return: The scope.
+        :type: ExtractionScope
+        """
+        kwargs = {}
+        for setting in (spec or "").split(cls.SPEC_SEPARATOR):
+            if "=" not in setting:
+                continue
+            name, value = setting.split("=", 1)
+            if name == "sub_root":
+                kwargs[name] = value
+            elif name == "max_depth":
+                kwargs[name] = int(value)
+            elif name in ("include_types", "exclude_types"):
+                kwargs[name] = [node_type for node_type in value.split(",") if node_type]
+
+        return cls(**kwargs)
+
+    def get_spec(self):
+        """
+        Writes the scope as a short string without quotes, ie. for a cache key or a
+        URL. Use get_token for a command line.
+
+        :return: The spec, an empty string for the whole asset.
+        :type: str
+        """
+        settings = []
+        if self.sub_root:
+            settings.append("sub_root=%s" % self.sub_root)
+        if self.max_depth is not None:
+            settings.append("max_depth=%d" % self.max_depth)
+        if self.include_types:
+            settings.append("include_types=%s" % ",".join(self.include_types))
+        if self.exclude_types:
+            settings.append("exclude_types=%s" % ",".join(self.exclude_types))
+
+        return self.SPEC_SEPARATOR.join(settings)
+
+    @classmethod
+    def from_token(cls, token=None):
+        """
+        Builds a scope back from get_token.
+
+        :param token: The token, ie. from the maya batch command line.
+        :type: str
+
+        :return: The scope.
+        :type: ExtractionScope
+        """
+        return cls.parse(bytes.fromhex(token or "").decode("utf-8"))
+
+    def get_token(self):
+        """
+        Gets the spec as hex, so it can go through a command line. The spec has "|"
+        and ";" in it, and cmd.exe would read those as pipes and separators.
+
+        :return: The token, an empty string for the whole asset.
+        :type: str
+        """
+        return self.get_spec().encode("utf-8").hex()
+
+    def get_key(self):
+        """
+        Gets a key safe to use in a file name. Scopes with the same settings get the
+        same key.
+
+        :return: The key, None for the whole asset.
+        :type: str
+        """
+        if self.is_full():
+            return None
+
+        return hashlib.sha1(self.get_spec().encode("utf-8")).hexdigest()[:12]
+
+    def is_full(self):
+        """
+        :return: Whether this is the whole asset.
+        :type: bool
+        """
+        return not self.get_spec()
+
+    def has_type_filters(self):
+        """
+        :return: Whether the scope needs Maya to look at node types.
+        :type: bool
+        """
+        return bool(self.include_types or self.exclude_types)
+
+    def get_root_suffix(self, root=None):
+        """
+        Gets the part of the sub-root below the hierarchy root, so it can be added to
+        the root's path in the scene.
+
+        :param root: The normalized path of the hierarchy root, ie. "|geometry_GRP".
+        :type: str
+
+        :return: The rest of the sub-root, ie. "|ren_GRP". An empty string if there's
+                 no sub-root and None if the sub-root isn't under the root.
+        :type: str
+        """
+        if not self.sub_root or self.sub_root == root:
+            return ""
+        elif self.sub_root.startswith(root + "|"):
+            return self.sub_root[len(root):]
+
+        return None
+
+    def contains(self, path=None):
+        """
+        :param path: A normalized node path.
+        :type: str
+
+        :return: Whether the path is under the sub-root and not too deep.
+        :type: bool
+        """
+        if not self.sub_root:
+            depth = path.count("|") - 1
+        elif path == self.sub_root:
+            return True
+        elif path.startswith(self.sub_root + "|"):
+            depth = path.count("|", len(self.sub_root))
+        else:
+            return False
+
+        return self.max_depth is None or depth <= self.max_depth
+
+    def filter_paths(self, paths=None):
+        """
+        Keeps the paths in the sub-root and depth, ie. to narrow a full snapshot
+        without extracting again.
+
+        :param paths: Normalized node paths.
+        :type: list
+
+        :return: The paths in the scope, in the same order.
+        :type: list
+        """
+        if not self.sub_root and self.max_depth is None:
+            return list(paths or [])
+
+        return [path for path in paths or [] if self.contains(path)]
+
+    def select_types(self, paths=None, included=None, excluded=None):
+        """
+        Applies the type filters once Maya found which paths match them.
+
+        :param paths: The node paths, parents before children.
+        :type: list
+
+        :param included: The paths that matched include_types.
+        :type: set
+
+        :param excluded: The paths that matched exclude_types.
+        :type: set
+
+        :return: The paths that are kept, in the same order.
+        :type: list
+        """
+        paths = list(paths or [])
+
+        # Excluding a node takes everything under it too.
+        if self.exclude_types and excluded:
+            dropped = set()
+            kept = []
+            for path in paths:
+                parent = path.rsplit("|", 1)[0]
+                if path in excluded or parent in dropped:
+                    dropped.add(path)
+                    continue
+                kept.append(path)
+            paths = kept
+
+        # Including a node keeps the groups above it so the tree still holds together.
+        if self.include_types:
+            wanted = set()
+            for path in paths:
+                if path not in (included or ()):
+                    continue
+                while path and path not in wanted:
+                    wanted.add(path)
+                    path = path.rsplit("|", 1)[0]
+            paths = [path for path in paths if path in wanted]
+
+        return paths
+
+    def __eq__(self, other):
+        return isinstance(other, ExtractionScope) and self.get_spec() == other.get_spec()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.get_spec())
+
+    def __repr__(self):
+        return "ExtractionScope(%r)" % self.get_spec()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# SETMODE 777
+
+# ----------------------------------------------------------------------------------------#
+# ------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Andy Tran - axt170020
+
+:synopsis:
+    Finds nodes by name across the hierarchies of a check.
+
+:description:
+    HierarchySearchIndex is built once for every check. It keeps every path and
+    leaf name sorted so prefix searches are a binary search. For substring searches
+    the sorted names are also joined into one string, so str.find scans them at C
+    speed and the search stops as soon as it has enough results. That keeps
+    searching as you type quick on assets with 100k nodes.
+
+    The index also keeps the check's diffs, so it can tell where a node from one
+    discipline ended up in another. Moves and renames are followed.
+
+:applications:
+    None, this is plain Python.
+
+:see_also:
+    hierarchy_check_diff.py
+    hierarchy_check_gui.py
+"""
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- CLASSES --#
+
+class HierarchySearchIndex(object):
+    """
+    A search index over the node paths of one check.
+    """
+    # Joins the names, it can't be typed into a search.
+    SEPARATOR = "\n"
+
+    def __init__(self, paths=None, reference=None, diffs=None):
+        """
+        :param paths: Every node path to search.
+        :type: list
+
+        :param reference: The discipline the others were compared to.
+        :type: str
+
+        :param diffs: The HierarchyDiff of every other discipline.
+        :type: dict
+        """
+        self.reference = reference
+        self.diffs     = dict(diffs or {})
+
+        # Sorted (lowered key, path) pairs, a binary search finds the first match of a
+        # prefix and the rest follow it.
+        unique_paths = set(paths or [])
+        self.path_keys = sorted((path.lower(), path) for path in unique_paths)
+        self.leaf_keys = sorted((path.rsplit("|", 1)[-1].lower(), path) \
+                                for path in unique_paths)
+
+        # Lots of nodes share a leaf name, so each name is only searched once.
+        self.leaf_paths = {}
+        for leaf, path in self.leaf_keys:
+            self.leaf_paths.setdefault(leaf, []).append(path)
+        self.leaves = sorted(self.leaf_paths)
+
+        # The names joined up for substring searches, and where each one starts.
+        self.leaf_text, self.leaf_starts = self._join(self.leaves)
+        self.path_text, self.path_starts = self._join([key for key, path in \
+                                                       self.path_keys])
+
+    @classmethod
+    def from_util(cls, hier_check_util=None):
+        """
+        Builds the index for a check, from every snapshot read and the nodes that
+        failed.
+
+        :param hier_check_util: The util after get_info.
+        :type: HierarchyCheckUtil
+
+        :return: The index.
+        :type: HierarchySearchIndex
+        """
+        paths = []
+        for curr_disc in hier_check_util.asset_disc_list:
+            paths.extend(hier_check_util.read_hier.get(curr_disc) or [])
+
+        return cls(paths, reference=hier_check_util.asset_disc_list[0],
+                   diffs=hier_check_util.diffs)
+
+    def __len__(self):
+        return len(self.path_keys)
+
+    def find(self, query=None, limit=200):
+        """
+        Finds the paths matching a query, ignoring case. A query starting with "|"
+        matches the start of the path. Otherwise the leaf names starting with it come
+        first, then the ones containing it. A query with a "|" in it is looked for
+        anywhere in the path.
+
+        :param query: What was typed, ie. "pCyl" or "|geometry_GRP|ren_GRP".
+        :type: str
+
+        :param limit: The most paths to return.
+        :type: int
+
+        :return: The matching paths.
+        :type: list
+        """
+        query = (query or "").strip().lower()
+        if not query:
+            return []
+
+        results = []
+        found = set()
+
+        def add(paths):
+            for path in paths:
+                if path not in found:
+                    found.add(path)
+                    results.append(path)
+                if len(results) >= limit:
+                    return True
+            return False
+
+        if query.startswith("|"):
+            add(self._find_prefix(self.path_keys, query, limit))
+            return results
+
+        if add(self._find_prefix(self.leaf_keys, query, limit)):
+            return results
+
+        query = query.replace(self.SEPARATOR, "")
+        if "|" in query:
+            add(self.path_keys[index][1] for index in \
+                self._find_substring(self.path_text, self.path_starts, query))
+            return results
+
+        for index in self._find_substring(self.leaf_text, self.leaf_starts, query):
+            if add(self.leaf_paths[self.leaves[index]]):
+                break
+
+        return results
+
+    def _find_prefix(self, keys, query, limit):
+        """
+        Goes through the sorted keys starting with the query.
+
+        :param keys: Sorted (key, path) pairs.
+        :type: list
+
+        :param query: The lowered prefix.
+        :type: str
+
+        :param limit: The most paths to go through.
+        :type: int
+
+        :return: The paths whose key starts with the query.
+        :type: generator
+        """
+        index = bisect_left(keys, (query,))
+        stop = min(index + limit, len(keys))
+        while index < stop and keys[index][0].startswith(query):
+            yield keys[index][1]
+            index += 1
+
+    def _join(self, keys):
+        """
+        Joins sorted keys into one string for _find_substring.
+
+        :param keys: The lowered keys.
+        :type: list
+
+        :return: The joined keys and the offset each one starts at.
+        :type: tuple
+        """
+        starts = [0]
+        starts.extend(accumulate(len(key) + len(self.SEPARATOR) for key in keys))
+
+        return self.SEPARATOR.join(keys), starts[:len(keys)]
+
+    def _find_substring(self, text, starts, query):
+        """
+        Goes through the keys containing the query, in sorted order. It's lazy, so
+        the search stops once the caller has enough.
+
+        :param text: The joined keys.
+        :type: str
+
+        :param starts: Where each key starts in the text.
+        :type: list
+
+        :param query: The lowered query, without the separator.
+        :type: str
+
+        :return: The index of each key containing the query.
+        :type: generator
+        """
+        position = text.find(query)
+        while position != -1:
+            index = bisect_right(starts, position) - 1
+            yield index
+
+            # Skip to the next key, the same key shouldn't come up twice.
+            if index + 1 >= len(starts):
+                break
+            position = text.find(query, starts[index + 1])
+
+    def find_counterpart(self, path=None, disc=None, other_disc=None):
+        """
+        Finds where a node of one discipline is in another. It goes through the
+        reference, so a node that was moved or renamed downstream is found where it
+        went.
+
+        :param path: The node path.
+        :type: str
+
+        :param disc: The discipline the path is from.
+        :type: str
+
+        :param other_disc: The discipline to find it in.
+        :type: str
+
+        :return: The path in the other discipline. It's the same path if nothing was
+                 recorded about it.
+        :type: str
+        """
+        if disc == other_disc:
+            return path
+
+        # Back to the reference, a downstream node may have come from somewhere else.
+        diff = self.diffs.get(disc)
+        if disc != self.reference and diff:
+            path = diff.get_arrival(path) or diff.get_rename_source(path) or path
+
+        # Then out to the other discipline.
+        diff = self.diffs.get(other_disc)
+        if other_disc != self.reference and diff:
+            path = diff.moved.get(path) or diff.get_rename(path) or path
+
+        return path
@@ -0,0 +1,592 @@
+#!/usr/bin/env python
+# SETMODE 777
+
+# ----------------------------------------------------------------------------------------#
+# ------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Andy Tran - axt170020
+
+:synopsis:
+    A local service that runs hierarchy checks and shares the results.
+
+:description:
+    HierarchyCheckService wraps HierarchyCheckUtil with an in-memory LRU of the
+    parsed snapshots and diff results. If two callers ask for the same asset at the
+    same time, only one check runs and both get its result. Cached results are
+    thrown out when one of their text files changes.
+
+    serve() puts the service on HTTP on localhost so headless sweeps and other tools
+    on the machine share one cache, and HierarchyCheckClient talks to it. The GUI
+    doesn't go through it, it needs the live diff objects to fill the tree, so it
+    keeps its own HierarchyCheckUtil. The service has the same methods as the
+    client, so it doubles as the local stand-in when there's no server running, and
+    its loader can be swapped out to run it without Shotgrid or Maya.
+
+    Requests are answered in parallel, but the maya batches behind them run one at
+    a time, since killing one on Windows kills them all.
+
+    GET  /check?project=<project>&asset=<asset>[&disciplines=model,rig,surface]
+                                               [&scope=<ExtractionScope spec>]
+    GET  /snapshot?project=<project>&asset=<asset>&discipline=<disc>[&scope=<spec>]
+    POST /invalidate?project=<project>[&asset=<asset>]
+    GET  /health
+
+:applications:
+    None to run the service. The default loader needs the same pipeline as
+    HierarchyCheckUtil.
+
+:see_also:
+    hierarchy_check_utils.py
+"""
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import URLError
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import Request, urlopen
+import json
+import os
+import threading
+
+# External
+from gen_utils.utils import IO
+from maya_tools.utils.hierarchy_check_scope import ExtractionScope
+
+
+# ----------------------------------------------------------------------------------------#
+# --------------------------------------------------------------------------- FUNCTIONS --#
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+def load_asset_check(project=None, asset=None, disciplines=None, scope=None):
+    """
+    The default loader, checks an asset the same way the GUI does.
+
+    :param project: The project name.
+    :type: str
+
+    :param asset: The asset name.
+    :type: str
+
+    :param disciplines: The disciplines to check, modeling first.
+    :type: list
+
+    :param scope: The part of the hierarchy to check.
+    :type: ExtractionScope
+
+    :return: The util after get_info, None if the check didn't work.
+    :type: HierarchyCheckUtil
+    """
+    # Imported here so the service can run with a different loader without the
+    # pipeline around.
+    from shotgun_tools.sg_pipe_objects import ProjectFetcher
+    from maya_tools.utils.hierarchy_check_utils import HierarchyCheckUtil
+
+    project_obj = ProjectFetcher().get_project_object(project)
+    asset_obj = project_obj.get_asset(asset) if project_obj else None
+    if not asset_obj or not asset_obj.is_asset:
+        return None
+
+    hier_check_util = HierarchyCheckUtil(disciplines=disciplines, scope=scope)
+    hier_check_util.set_asset_obj(asset_obj)
+    if not hier_check_util.get_info():
+        return None
+
+    return hier_check_util
+
+def serialize_check(hier_check_util=None):
+    """
+    Turns the results of a util into plain data that can go over the wire. Every
+    discipline's text file is listed, even the ones that don't exist yet, so a cached
+    result can tell when one shows up.
+
+    :param hier_check_util: The util after get_info.
+    :type: HierarchyCheckUtil
+
+    :return: The snapshots and the diff of each discipline, ie.
+             {"disciplines": ["model", "rig"],
+              "snapshots": {"model": [...], "rig": [...]},
+              "sources": {"model": "...asset_hier.txt", ...},
+              "text_files": {"model": "...asset_hier.txt", "rig": ..., ...},
+              "diffs": {"rig": {"missing": [...], "moved": {...}, ...}}}
+    :type: dict
+    """
+    result = {"disciplines": list(hier_check_util.asset_disc_list),
+              "snapshots": dict(hier_check_util.read_hier),
+              "sources": dict((curr_disc, path) for curr_disc, path in \
+                              hier_check_util.text_file_paths.items() if path),
+              "text_files": dict((curr_disc,
+                                  hier_check_util.get_text_file_path(curr_disc)) \
+                                 for curr_disc in hier_check_util.asset_disc_list),
+              "diffs": {}}
+
+    for curr_disc, diff in hier_check_util.diffs.items():
+        result["diffs"][curr_disc] = {
+            "failures": list(diff.failures),
+            "missing": list(diff.missing),
+            "moved": dict(diff.moved),
+            "extra": list(diff.extra),
+            "renames": dict((path, list(rename)) for path, rename in \
+                            diff.renames.items()),
+            "geo_changes": hier_check_util.get_geo_changes(curr_disc)}
+
+    return result
+
+def serve(port=DEFAULT_PORT, service=None, host=DEFAULT_HOST):
+    """
+    Serves the hierarchy checks on localhost until it's interrupted.
+
+    :param port: The port to listen on.
+    :type: int
+
+    :param service: The service to serve, a new one if not given.
+    :type: HierarchyCheckService
+
+    :param host: The address to listen on, only localhost by default.
+    :type: str
+    """
+    server = make_server(port=port, service=service, host=host)
+    IO.info("Serving hierarchy checks on http://%s:%d" % server.server_address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def make_server(port=DEFAULT_PORT, service=None, host=DEFAULT_HOST):
+    """
+    Makes the HTTP server without starting it, ie. to run it in a thread.
+
+    :param port: The port to listen on, 0 picks a free one.
+    :type: int
+
+    :param service: The service to serve, a new one if not given.
+    :type: HierarchyCheckService
+
+    :param host: The address to listen on.
+    :type: str
+
+    :return: The server.
+    :type: ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer((host, port), HierarchyCheckHandler)
+    server.daemon_threads = True
+    server.service = service or HierarchyCheckService()
+
+    return server
+
+def get_client(port=DEFAULT_PORT, host=DEFAULT_HOST, fallback=True):
+    """
+    Gets something to ask for hierarchy checks. The server if it's running,
+    otherwise a service in this process.
+
+    :param port: The port the server listens on.
+    :type: int
+
+    :param host: The address the server listens on.
+    :type: str
+
+    :param fallback: Use a local service if the server isn't up.
+    :type: bool
+
+    :return: The client or the local service, they have the same methods.
+    :type: HierarchyCheckClient
+    """
+    client = HierarchyCheckClient(port=port, host=host)
+    if client.is_alive() or not fallback:
+        return client
+
+    return HierarchyCheckService()
+
+# ----------------------------------------------------------------------------------------#
+# ----------------------------------------------------------------------------- CLASSES --#
+
+class HierarchyCheckService(object):
+    """
+    Runs the checks, caches them and makes sure the same asset isn't checked twice
+    at once.
+    """
+    def __init__(self, loader=None, cache_size=64):
+        """
+        :param loader: Takes (project, asset, disciplines, scope) and returns a util
+                       after get_info, or None. load_asset_check if not given.
+        :type: function
+
+        :param cache_size: How many checked assets to keep.
+        :type: int
+        """
+        self.loader     = loader or load_asset_check
+        self.cache_size = cache_size
+
+        self.lock      = threading.Lock()
+        self.cache     = OrderedDict()
+        self.in_flight = {}
+
+    def check(self, project=None, asset=None, disciplines=None, scope=None):
+        """
+        Gets the check of an asset, from the cache if its text files haven't changed.
+        Each scope is cached on its own.
+
+        :param project: The project name.
+        :type: str
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disciplines: The disciplines to check, modeling first.
+        :type: list
+
+        :param scope: The part of the hierarchy to check, or its spec.
+        :type: ExtractionScope
+
+        :return: The result from serialize_check, None if the check didn't work.
+        :type: dict
+        """
+        if not isinstance(scope, ExtractionScope):
+            scope = ExtractionScope.parse(scope)
+        key = (project, asset, tuple(disciplines or ()), scope.get_spec())
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry and self._is_fresh(entry):
+                self.cache.move_to_end(key)
+                return entry["result"]
+
+            # Someone else is already checking it, wait for theirs.
+            pending = self.in_flight.get(key)
+            if pending is None:
+                pending = Future()
+                self.in_flight[key] = pending
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        # Whoever is waiting gets the same error if the check blows up.
+        result = None
+        try:
+            hier_check_util = self.loader(project, asset, disciplines, scope)
+            if hier_check_util:
+                result = serialize_check(hier_check_util)
+                result["project"] = project
+                result["asset"] = asset
+                result["scope"] = scope.get_spec()
+        except Exception as error:
+            with self.lock:
+                del self.in_flight[key]
+            pending.set_exception(error)
+            raise
+
+        with self.lock:
+            del self.in_flight[key]
+            if result:
+                self.cache[key] = {"result": result,
+                                   "mtimes": self._get_mtimes(result)}
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        pending.set_result(result)
+
+        return result
+
+    def get_snapshot(self, project=None, asset=None, disc=None, scope=None):
+        """
+        Gets one discipline's parsed snapshot of an asset.
+
+        :param project: The project name.
+        :type: str
+
+        :param asset: The asset name.
+        :type: str
+
+        :param disc: The discipline.
+        :type: str
+
+        :param scope: The part of the hierarchy, or its spec.
+        :type: ExtractionScope
+
+        :return: The node paths, None if there's no snapshot.
+        :type: list
+        """
+        result = self.check(project, asset, scope=scope)
+        if not result:
+            return None
+
+        return result["snapshots"].get(disc)
+
+    def invalidate(self, project=None, asset=None):
+        """
+        Drops cached checks, ie. after a publish.
+
+        :param project: The project name.
+        :type: str
+
+        :param asset: The asset name, every asset of the project if not given.
+        :type: str
+
+        :return: How many checks were dropped.
+        :type: int
+        """
+        with self.lock:
+            keys = [key for key in self.cache if key[0] == project and \
+                    (asset is None or key[1] == asset)]
+            for key in keys:
+                del self.cache[key]
+
+        return len(keys)
+
+    def is_alive(self):
+        """
+        :return: Always True, it's running in this process.
+        :type: bool
+        """
+        return True
+
+    def _get_mtimes(self, result):
+        """
+        Gets the modified times of every text file a result could be read from,
+        including the ones that didn't exist when it was checked.
+
+        :param result: The result from serialize_check.
+        :type: dict
+
+        :return: The modified time of each text file, None if it doesn't exist.
+        :type: dict
+        """
+        mtimes = {}
+        for path in result.get("text_files", {}).values():
+            mtimes[path] = os.path.getmtime(path) if os.path.exists(path) else None
+
+        return mtimes
+
+    def _is_fresh(self, entry):
+        """
+        :param entry: The cache entry.
+        :type: dict
+
+        :return: Whether none of the entry's text files changed, showed up or went
+                 away.
+        :type: bool
+        """
+        return self._get_mtimes(entry["result"]) == entry["mtimes"]
+
+
+class HierarchyCheckHandler(BaseHTTPRequestHandler):
+    """
+    Answers the HTTP requests with the server's service.
+    """
+    def do_GET(self):
+        """
+        Handles /check, /snapshot and /health.
+        """
+        self._respond(self._handle_get)
+
+    def do_POST(self):
+        """
+        Handles /invalidate.
+        """
+        self._respond(self._handle_post)
+
+    def _respond(self, handle):
+        """
+        Runs a handler, answering with a 500 instead of dropping the connection if it
+        raises.
+
+        :param handle: The handler to run.
+        :type: function
+        """
+        try:
+            handle()
+        except Exception as error:
+            IO.warning("Hierarchy check request %s failed: %s" % (self.path, error))
+            self._send_json(500, {"error": str(error)})
+
+    def _handle_get(self):
+        """
+        Handles /check, /snapshot and /health.
+        """
+        url = urlparse(self.path)
+        query = self._get_query(url)
+        service = self.server.service
+
+        if url.path == "/health":
+            return self._send_json(200, {"ok": True})
+        elif url.path == "/check":
+            disciplines = [disc for disc in query.get("disciplines", "").split(",") \
+                           if disc]
+            result = service.check(query.get("project"), query.get("asset"),
+                                   disciplines or None, query.get("scope"))
+        elif url.path == "/snapshot":
+            result = service.get_snapshot(query.get("project"), query.get("asset"),
+                                          query.get("discipline"), query.get("scope"))
+        else:
+            return self._send_json(404, {"error": "Unknown path %s" % url.path})
+
+        if result is None:
+            return self._send_json(404, {"error": "Nothing found."})
+
+        return self._send_json(200, result)
+
+    def _handle_post(self):
+        """
+        Handles /invalidate.
+        """
+        url = urlparse(self.path)
+        query = self._get_query(url)
+        if url.path != "/invalidate":
+            return self._send_json(404, {"error": "Unknown path %s" % url.path})
+
+        dropped = self.server.service.invalidate(query.get("project"), query.get("asset"))
+
+        return self._send_json(200, {"dropped": dropped})
+
+    def log_message(self, format, *args):
+        """
+        Keeps the requests out of the Maya script editor.
+        """
+        return None
+
+    def _get_query(self, url):
+        """
+        :param url: The parsed request url.
+        :type: urllib.parse.ParseResult
+
+        :return: The query, one value for each key.
+        :type: dict
+        """
+        return dict((key, values[0]) for key, values in parse_qs(url.query).items())
+
+    def _send_json(self, status, data):
+        """
+        Sends a JSON response.
+
+        :param status: The HTTP status code.
+        :type: int
+
+        :param data: What to send.
+        :type: dict
+        """
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class HierarchyCheckClient(object):
+    """
+    Asks the local server for hierarchy checks. It has the same methods as
+    HierarchyCheckService.
+    """
+    def __init__(self, port=DEFAULT_PORT, host=DEFAULT_HOST, timeout=300):
+        """
+        :param port: The port the server listens on.
+        :type: int
+
+        :param host: The address the server listens on.
+        :type: str
+
+        :param timeout: How long to wait on a check, maya batches can take a while.
+        :type: float
+        """
+        self.base_url = "http://%s:%d" % (host, port)
+        self.timeout  = timeout
+
+    def check(self, project=None, asset=None, disciplines=None, scope=None):
+        """
+        :return: The result from serialize_check, None if the check didn't work.
+        :type: dict
+        """
+        query = {"project": project, "asset": asset}
+        if disciplines:
+            query["disciplines"] = ",".join(disciplines)
+        if scope:
+            query["scope"] = self._get_spec(scope)
+
+        return self._request("GET", "/check", query)
+
+    def get_snapshot(self, project=None, asset=None, disc=None, scope=None):
+        """
+        :return: The node paths, None if there's no snapshot.
+        :type: list
+        """
+        query = {"project": project, "asset": asset, "discipline": disc}
+        if scope:
+            query["scope"] = self._get_spec(scope)
+
+        return self._request("GET", "/snapshot", query)
+
+    def invalidate(self, project=None, asset=None):
+        """
+        :return: How many checks were dropped.
+        :type: int
+        """
+        query = {"project": project}
+        if asset:
+            query["asset"] = asset
+        result = self._request("POST", "/invalidate", query)
+
+        return result["dropped"] if result else 0
+
+    def is_alive(self):
+        """
+        :return: Whether the server answers.
+        :type: bool
+        """
+        try:
+            return bool(self._request("GET", "/health", {}, timeout=1))
+        except (URLError, OSError):
+            return False
+
+    def _get_spec(self, scope):
+        """
+        :param scope: A scope or its spec.
+        :type: ExtractionScope
+
+        :return: The spec.
+        :type: str
+        """
+        return scope.get_spec() if isinstance(scope, ExtractionScope) else scope
+
+    def _request(self, method, path, query, timeout=None):
+        """
+        Sends a request to the server.
+
+        :param method: "GET" or "POST".
+        :type: str
+
+        :param path: The url path, ie. "/check".
+        :type: str
+
+        :param query: The query arguments.
+        :type: dict
+
+        :param timeout: Overrides the client's timeout.
+        :type: float
+
+        :return: The JSON response, None on a 404. Any other error status raises.
+        :type: dict
+        """
+        request = Request("%s%s?%s" % (self.base_url, path, urlencode(query)),
+                          method=method, data=b"" if method == "POST" else None)
+        try:
+            with urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except URLError as error:
+            if getattr(error, "code", None) == 404:
+                return None
+            raise
+
+
+if __name__ == "__main__":
+    serve()
@@ -26,8 +26,11 @@
 
 # Default Python Imports
 import subprocess
+import glob
 import os
-import time
+import re
+import sqlite3
+import threading
 
 # External
 import maya.cmds as cmds
@@ -36,92 +39,655 @@ from core_tools.pipe_context import PipeContext
 from gen_utils.utils import IO
 from maya_tools.utils.maya_enums import NamingConventionEnums
 from gen_utils.pipe_enums import RigTypes
+from maya_tools.utils.hierarchy_check_diff import diff_disciplines
+from maya_tools.utils import hierarchy_check_fingerprints as fingerprints
+from maya_tools.utils.hierarchy_check_reports import iter_report_rows
+from maya_tools.utils.hierarchy_check_scope import ExtractionScope
 
 
 # ----------------------------------------------------------------------------------------#
 # --------------------------------------------------------------------------- FUNCTIONS --#
 
-def store_hierarchy(disc=None, output_dir=None):
+def store_hierarchy(disc=None, output_dir=None, fingerprint=False, scope=None):
     """
-    Gets information from the maya ascii file and stores it into a txt.
+    Gets information from the maya ascii file and stores it into a txt. This is what
+    the maya batch runs, so it quits Maya when it's done.
 
     :param disc: What discipline will this store the hierarchy from.
     :type: str
 
     :param output_dir: The file path to write the text file.
     :type: str
+
+    :param fingerprint: Also store the geometry fingerprints next to the txt.
+    :type: bool
+
+    :param scope: The part of the hierarchy to store, or its token from the command
+                  line. The whole asset if not given.
+    :type: ExtractionScope
+    """
+    if not isinstance(scope, ExtractionScope):
+        scope = ExtractionScope.from_token(scope)
+    geo_GRP_nodes, mesh_fingerprints = extract_hierarchy(disc, fingerprint=fingerprint,
+                                                         scope=scope)
+    if geo_GRP_nodes:
+        write_snapshot(geo_GRP_nodes, output_dir, mesh_fingerprints=mesh_fingerprints)
+
+    cmds.quit(force=True)
+
+    return True if geo_GRP_nodes else None
+
+def extract_hierarchy(disc=None, fingerprint=False, scope=None):
+    """
+    Gets the hierarchy from the scene that's open, without writing or quitting
+    anything.
+
+    :param disc: What discipline will this get the hierarchy from.
+    :type: str
+
+    :param fingerprint: Also get the geometry fingerprints.
+    :type: bool
+
+    :param scope: The part of the hierarchy to get. Only that part of the scene is
+                  walked. The whole asset if not given.
+    :type: ExtractionScope
+
+    :return: The normalized node paths and the fingerprints, (None, None) if the root
+             or the scope's sub-root couldn't be found.
+    :type: tuple
     """
     # Get the start of the modeling hierarchy from enums, we're expecting geometry_GRP.
     # If this is rigging, we're looking for just "geometry_GRP", modeling and surfacing
-    # can work with "|geometry_GRP"
+    # can work with "|geometry_GRP". Recursive lets us find the root in referenced or
+    # namespaced files too.
     root = NamingConventionEnums().MODEL_HIERARCHY[0] if not disc == "rig" \
         else NamingConventionEnums().RIG_HIERARCHY[5]
-    root_node = cmds.ls(root)
+    root_node = cmds.ls(root, long=True, recursive=True)
 
     # Verify the root node exists and its one of a kind in the scene.
     if not root_node:
-        return None
+        return None, None
     elif len(root_node) > 1:
-        return None
+        return None, None
+
+    # Start from the scope's sub-root instead if there is one. Its path is normalized,
+    # so it's found by adding what's below the root to the root's path in the scene.
+    scope = scope or ExtractionScope()
+    suffix = scope.get_root_suffix(get_normalizer().normalize(root_node[0], disc=disc))
+    if suffix is None:
+        return None, None
+    elif suffix:
+        root_node = cmds.ls(root_node[0] + suffix, long=True)
+        if not root_node:
+            return None, None
 
     # Gets all the descendents of the root node. Add the root to the descendants list.
-    # If this is rigging then take care of the prefixes.
-    children = cmds.listRelatives(root_node, allDescendents=True, fullPath=True,
-                                  children=True, type="transform")
+    # Every path gets normalized so rig prefixes and namespaces don't leak into the txt.
+    children = get_descendants(root_node, max_depth=scope.max_depth)
     children.sort()
-    geo_GRP_nodes = [root] + children
-    if disc == "rig":
-        geo_GRP_nodes = cut_rig_prefixes(geo_GRP_nodes)
-
-    # Create the document and name it after the discipline.
-    file1 = open("%s" % output_dir, "w")
-    # We'll make a string for the txt starting with the root node.
-    write_str = ""
+    long_paths = root_node + children
+    geo_GRP_nodes = get_normalizer().normalize_all(long_paths, disc=disc)
+
+    # Only look at node types if the scope asks for it, it's a few more queries.
+    if scope.has_type_filters():
+        kept = set(scope.select_types(
+            geo_GRP_nodes,
+            included=get_type_matches(long_paths, geo_GRP_nodes, scope.include_types),
+            excluded=get_type_matches(long_paths, geo_GRP_nodes, scope.exclude_types)))
+        long_paths = [long_path for long_path, path in zip(long_paths, geo_GRP_nodes) \
+                      if path in kept]
+        geo_GRP_nodes = [path for path in geo_GRP_nodes if path in kept]
+
+    # The fingerprints use the same normalized paths so they line up with the txt.
+    mesh_fingerprints = None
+    if fingerprint and fingerprints.has_numpy():
+        mesh_fingerprints = get_mesh_fingerprints(long_paths, geo_GRP_nodes)
+
+    return geo_GRP_nodes, mesh_fingerprints
+
+def get_descendants(root_node=None, max_depth=None):
+    """
+    Gets the transforms under the root. With a maximum depth it goes one level at a
+    time and stops there, instead of listing everything and throwing most of it out.
+
+    :param root_node: The full path of the root, in a list like cmds.ls gives.
+    :type: list
+
+    :param max_depth: How many levels below the root to get, every level if None.
+    :type: int
+
+    :return: The full paths of the descendants.
+    :type: list
+    """
+    if max_depth is None:
+        return cmds.listRelatives(root_node, allDescendents=True, fullPath=True,
+                                  children=True, type="transform") or []
+
+    descendants = []
+    level = root_node
+    for _ in range(max_depth):
+        level = cmds.listRelatives(level, children=True, fullPath=True,
+                                   type="transform") or []
+        if not level:
+            break
+        descendants.extend(level)
+
+    return descendants
+
+def get_type_matches(long_paths=None, paths=None, node_types=None):
+    """
+    Finds the transforms that are one of the node types, ie. "constraint", or have a
+    shape that is, ie. "mesh".
+
+    :param long_paths: The full paths of the transforms in the scene.
+    :type: list
+
+    :param paths: The normalized paths to return them as, in the same order.
+    :type: list
+
+    :param node_types: The Maya node types.
+    :type: list
+
+    :return: The normalized paths that matched.
+    :type: set
+    """
+    if not node_types or not long_paths:
+        return set()
+
+    # Both queries take the whole list at once.
+    matched = set(cmds.ls(long_paths, type=node_types, long=True) or [])
+    shapes = cmds.listRelatives(long_paths, shapes=True, fullPath=True,
+                                type=node_types, noIntermediate=True) or []
+    matched.update(shape.rsplit("|", 1)[0] for shape in shapes)
+
+    return set(path for long_path, path in zip(long_paths, paths) \
+               if long_path in matched)
+
+def write_snapshot(nodes=None, output_dir=None, mesh_fingerprints=None):
+    """
+    Writes the hierarchy txt, and the fingerprints if there are any. Each file is
+    written to a temp file next to it and swapped in, so nobody reading the publish
+    directory ever sees half a file. The txt goes last since that's what the checker
+    looks for. Without fingerprints, any old ones next to the txt are removed so they
+    never get compared against the new hierarchy.
+
+    :param nodes: The normalized node paths.
+    :type: list
+
+    :param output_dir: The file path to write the text file.
+    :type: str
+
+    :param mesh_fingerprints: The fingerprints to write next to the txt.
+    :type: GeometryFingerprints
+
+    :return: The path of the text file.
+    :type: str
+    """
+    fingerprint_path = fingerprints.get_fingerprint_path(output_dir)
+    if mesh_fingerprints is not None:
+        _write_atomic(fingerprint_path, mesh_fingerprints.save)
+    elif os.path.exists(fingerprint_path):
+        os.remove(fingerprint_path)
+
     # Add all the descendents of the root node to the txt string
-    for node in geo_GRP_nodes:
-        write_str += "%s\n" % node
+    write_str = "".join("%s\n" % node for node in nodes)
 
-    # Write the txt string and ends the command.
-    file1.write(write_str)
-    file1.close()
+    def write_txt(temp_path):
+        with open(temp_path, "w") as file1:
+            file1.write(write_str)
 
-    cmds.quit(force=True)
+    _write_atomic(output_dir, write_txt)
 
-    return True
+    return output_dir
+
+def _write_atomic(file_path=None, write_func=None):
+    """
+    Has write_func write a temp file in the same directory, then replaces file_path
+    with it. If anything goes wrong the temp file is cleaned up and file_path is left
+    as it was. The temp file is made by write_func itself, so it gets the same
+    permissions as any other file written there.
+
+    :param file_path: The file to end up with.
+    :type: str
+
+    :param write_func: Takes the temp file path and writes to it.
+    :type: function
+    """
+    # Unique to the process and thread, the prefetcher writes from several threads.
+    temp_path = "%s.%d.%d.tmp" % (file_path, os.getpid(), threading.get_ident())
+    try:
+        write_func(temp_path)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def publish_hierarchy(asset_obj=None, disc=None, context=None, fingerprint=True,
+                      history=None):
+    """
+    Meant for publish tools to call while the scene is still open. Gets the
+    hierarchy from this Maya session and writes the snapshot where the checker looks
+    for it, so the checker doesn't need to start a maya batch later.
+
+    :param asset_obj: The SG asset obj being published.
+    :type: SG Asset Obj
+
+    :param disc: The discipline being published.
+    :type: str
+
+    :param context: The pipe context used to find the publish directory.
+    :type: PipeContext
+
+    :param fingerprint: Also write the geometry fingerprints.
+    :type: bool
+
+    :param history: The SnapshotHistory to add the published hierarchy to.
+    :type: SnapshotHistory
+
+    :return: The path of the text file, None if it couldn't be written.
+    :type: str
+    """
+    hier_check_util = HierarchyCheckUtil(context=context)
+    if not hier_check_util.set_asset_obj(asset_obj):
+        IO.error("No valid asset given to publish the hierarchy of.")
+        return None
+
+    geo_GRP_nodes, mesh_fingerprints = extract_hierarchy(disc, fingerprint=fingerprint)
+    if not geo_GRP_nodes:
+        IO.warning("No single %s root found, the hierarchy was not published." % disc)
+        return None
+
+    output_txt = hier_check_util.get_text_file_path(disc)
+    try:
+        write_snapshot(geo_GRP_nodes, output_txt, mesh_fingerprints=mesh_fingerprints)
+    except (IOError, OSError):
+        IO.error("Unable to write the %s hier file at \n%s" % (disc, output_txt))
+        return None
+
+    IO.success("Published the %s %s hier file at \n%s" % (asset_obj.name, disc,
+                                                            output_txt))
+
+    # Every publish is a version, so the history doesn't miss anything the checker
+    # never got to read.
+    if history:
+        history.add_version(asset_obj.name, disc, geo_GRP_nodes, source=output_txt)
+
+    return output_txt
+
+def get_mesh_fingerprints(long_paths=None, paths=None):
+    """
+    Gets the geometry fingerprint of every transform that has a mesh under it.
+
+    :param long_paths: The full paths of the transforms in the scene.
+    :type: list
+
+    :param paths: The normalized paths to store them under, in the same order.
+    :type: list
+
+    :return: The fingerprints of the meshes.
+    :type: GeometryFingerprints
+    """
+    rows = []
+    for long_path, path in zip(long_paths, paths):
+        shapes = cmds.listRelatives(long_path, shapes=True, fullPath=True, type="mesh",
+                                    noIntermediate=True)
+        if not shapes:
+            continue
+
+        # Everything is in object space so moving a group doesn't count as a change.
+        shape = shapes[0]
+        bbox = cmds.polyEvaluate(shape, boundingBox=True)
+        points = cmds.xform("%s.vtx[*]" % shape, query=True, translation=True,
+                            objectSpace=True)
+        rows.append((path,
+                     cmds.polyEvaluate(shape, vertex=True),
+                     cmds.polyEvaluate(shape, face=True),
+                     cmds.polyEvaluate(shape, uvcoord=True),
+                     [value for axis in bbox for value in axis],
+                     fingerprints.hash_points(points)))
+
+    return fingerprints.GeometryFingerprints.from_rows(rows)
 
 def cut_rig_prefixes(nodes_list=None):
     """
     In rigging it gives "|master|geometry_GRP|..." and this function removes those
-    prefixes leaving just "|geometry_GRP|..." like modeling and surfacing.
+    prefixes leaving just "|geometry_GRP|..." like modeling and surfacing. Kept for
+    older callers, the rules now live in the HierarchyNormalizer.
 
     :param nodes_list: The names we got from the rig file under geometry_GRP.
     :type: list
+
+    :return: The nodes with the rig prefixes removed.
+    :type: list
     """
-    # Runs through each item and cuts the master geometry leading just to |geometry_GRP.
-    return_list = []
-    for node in nodes_list:
-        return_list.append(node.split("%s" % \
-                                      NamingConventionEnums().RIG_HIERARCHY[4], 1)[1])
+    return get_normalizer().normalize_all(nodes_list or [], disc=Discipline.RIG.name)
 
-    return return_list
+def get_normalizer():
+    """
+    Returns the shared normalizer built from the pipeline naming conventions. It's
+    only compiled the first time it's asked for.
+
+    :return: The compiled normalizer.
+    :type: HierarchyNormalizer
+    """
+    global _NORMALIZER
+    if _NORMALIZER is None:
+        _NORMALIZER = HierarchyNormalizer(HierarchyNormalizer.default_rules())
+
+    return _NORMALIZER
+
+def set_normalizer(rules=None):
+    """
+    Swaps the shared normalizer for one built from other rules, ie. for a project
+    with its own naming conventions. Everything normalizing afterwards uses it.
+
+    The text files are normalized again when they're read, so the rules don't need
+    to reach the maya batches, but the sub-root of a scope is found in the batch
+    with the pipeline rules.
+
+    :param rules: The rules for each discipline, like HierarchyNormalizer takes.
+                  The pipeline rules are put back if not given.
+    :type: dict
+
+    :return: The compiled normalizer.
+    :type: HierarchyNormalizer
+    """
+    global _NORMALIZER
+    _NORMALIZER = HierarchyNormalizer(rules or HierarchyNormalizer.default_rules())
+
+    return _NORMALIZER
+
+_NORMALIZER = None
+
+# Killing a maya batch on Windows kills all of them, so only one runs at a time in
+# the process, whether it's for the GUI, the prefetcher or the service.
+_MAYA_BATCH_LOCK = threading.Lock()
+
+def report_project(project=None, asset_names=None, writer=None, context=None,
+                   disciplines=None, create=False):
+    """
+    Checks a list of assets and streams the results into a report. Each asset is
+    written as soon as it's checked and then let go, so memory doesn't grow with the
+    project.
+
+    :param project: The SG project obj the assets belong to.
+    :type: SG Project Obj
+
+    :param asset_names: The assets to check, ie. project.get_asset_names().
+    :type: list
+
+    :param writer: Where the rows go.
+    :type: ReportWriter
+
+    :param context: The pipe context used to find the files.
+    :type: PipeContext
+
+    :param disciplines: The disciplines to check, modeling first.
+    :type: list
+
+    :param create: Run maya batches for missing text files. Off by default since a
+                   project wide run would take forever.
+    :type: bool
+
+    :return: How many rows were written.
+    :type: int
+    """
+    row_count = 0
+    for asset_name in asset_names or []:
+        asset_obj = project.get_asset(asset_name)
+        if not asset_obj or not asset_obj.is_asset:
+            continue
+
+        hier_check_util = HierarchyCheckUtil(context=context, disciplines=disciplines)
+        hier_check_util.set_asset_obj(asset_obj)
+        hier_check_util.get_maya_files()
+        if not hier_check_util.check_for_text_files(create=create):
+            continue
+        hier_check_util.get_text_info()
+        hier_check_util.match_items()
+
+        row_count += hier_check_util.write_report(writer)
+
+    return row_count
 
 # ----------------------------------------------------------------------------------------#
 # ----------------------------------------------------------------------------- CLASSES --#
 
+class NormalizationRules(object):
+    """
+    The naming rules for a single discipline. These are plain settings, the
+    HierarchyNormalizer is what turns them into matchers.
+    """
+    def __init__(self, strip_prefixes=None, strip_namespaces=True, suffix_map=None,
+                 case=None, root=None):
+        """
+        :param strip_prefixes: Markers to cut the path at, everything before and
+                               including the first marker found gets removed.
+                               ie. ["|master"] turns "|master|geometry_GRP" into
+                               "|geometry_GRP".
+        :type: list
+
+        :param strip_namespaces: Remove "ns:" from every node in the path.
+        :type: bool
+
+        :param suffix_map: Suffixes to swap on each node, ie. {"_RIG": "_GEO"}.
+        :type: dict
+
+        :param case: None to leave the case alone, otherwise "lower" or "upper".
+        :type: str
+
+        :param root: The path the hierarchy starts at once the prefix is cut, ie.
+                     "|geometry_GRP". Paths already starting there are left alone by
+                     strip_prefixes, so normalizing twice doesn't cut a node that's
+                     named like a marker.
+        :type: str
+        """
+        self.strip_prefixes   = list(strip_prefixes or [])
+        self.strip_namespaces = strip_namespaces
+        self.suffix_map       = dict(suffix_map or {})
+        self.case             = case
+        self.root             = root
+
+
+class HierarchyNormalizer(object):
+    """
+    Compiles NormalizationRules once into regular expressions so whole snapshots can
+    be normalized in bulk. Paths that don't match a rule are left alone instead of
+    raising.
+    """
+    CASES = ("lower", "upper")
+
+    # Matches one or more "ns:" at the start of the path or right after a divider.
+    NAMESPACE_RE = re.compile(r"(^|\|)(?:[^|:]+:)+")
+
+    def __init__(self, rules=None):
+        """
+        :param rules: The rules for each discipline. The "default" key, if given, is
+                      used for disciplines that don't have their own rules.
+        :type: dict
+        """
+        self.rules    = dict(rules or {})
+        self.compiled = {}
+        self.compile()
+
+    @classmethod
+    def default_rules(cls):
+        """
+        Builds the rules the pipeline uses. Rigging has the extra prefix above
+        geometry_GRP, every discipline gets namespaces removed.
+
+        :return: The rules for each discipline.
+        :type: dict
+        """
+        rig_prefix = NamingConventionEnums().RIG_HIERARCHY[4]
+        rig_root = "|%s" % NamingConventionEnums().RIG_HIERARCHY[5].lstrip("|")
+
+        return {"default": NormalizationRules(),
+                Discipline.RIG.name: NormalizationRules(strip_prefixes=[rig_prefix],
+                                                        root=rig_root)}
+
+    def compile(self):
+        """
+        Turns every discipline's rules into the list of steps normalize runs.
+        """
+        self.compiled.clear()
+        for disc in self.rules:
+            self.compiled[disc] = self._compile_rules(self.rules[disc])
+
+    def _compile_rules(self, rules):
+        """
+        Builds the steps for one set of rules. Each step is a function taking a path
+        and returning the new path.
+
+        :param rules: The rules to compile.
+        :type: NormalizationRules
+
+        :return: The steps in the order they should run.
+        :type: list
+        """
+        steps = []
+
+        # Namespaces go first so the prefix markers don't need to know about them.
+        if rules.strip_namespaces:
+            steps.append(lambda path: self.NAMESPACE_RE.sub(r"\1", path))
+
+        # One pattern for all markers, the lazy match cuts at the first one found. A
+        # path that already starts at the root has no prefix left to cut.
+        if rules.strip_prefixes:
+            markers = "|".join(re.escape(marker) for marker in rules.strip_prefixes)
+            root_guard = r"(?!%s(?:\||$))" % re.escape(rules.root) if rules.root else ""
+            prefix_re = re.compile(r"^%s.*?(?:%s)(?=\||$)" % (root_guard, markers))
+            steps.append(lambda path: prefix_re.sub("", path, count=1))
+
+        # Suffixes only match at the end of a node, before a divider or the end.
+        if rules.suffix_map:
+            suffix_map = rules.suffix_map
+            suffixes = sorted(suffix_map, key=len, reverse=True)
+            suffix_re = re.compile(r"(%s)(?=\||$)" % "|".join(re.escape(suffix) \
+                                                               for suffix in suffixes))
+            steps.append(lambda path: suffix_re.sub(
+                lambda match: suffix_map[match.group(1)], path))
+
+        if rules.case in self.CASES:
+            steps.append(str.lower if rules.case == "lower" else str.upper)
+
+        return steps
+
+    def normalize(self, path, disc=None):
+        """
+        Normalizes a single node path.
+
+        :param path: The full path of the node.
+        :type: str
+
+        :param disc: The discipline the path came from.
+        :type: str
+
+        :return: The normalized path.
+        :type: str
+        """
+        for step in self._get_steps(disc):
+            path = step(path)
+
+        return path
+
+    def normalize_all(self, paths, disc=None):
+        """
+        Normalizes a whole snapshot at once, the steps are looked up only once.
+
+        :param paths: The full paths of the nodes.
+        :type: list
+
+        :param disc: The discipline the paths came from.
+        :type: str
+
+        :return: The normalized paths in the same order.
+        :type: list
+        """
+        paths = list(paths)
+        for step in self._get_steps(disc):
+            paths = [step(path) for path in paths]
+
+        return paths
+
+    def _get_steps(self, disc):
+        """
+        Finds the compiled steps for the discipline, falling back to "default".
+
+        :param disc: The discipline.
+        :type: str
+
+        :return: The compiled steps.
+        :type: list
+        """
+        if disc in self.compiled:
+            return self.compiled[disc]
+
+        return self.compiled.get("default", [])
+
+
 class HierarchyCheckUtil(object):
     """
     Class for the GUI.
     """
     ASSET_DIR = "as_pub_official_dir"
 
-    def __init__(self, context=None):
+    # How to get the maya file of each discipline from the SG asset obj, as the
+    # method name and its kwargs. Any other discipline uses
+    # "get_official_<disc>_file".
+    DISC_FILE_GETTERS = {Discipline.MODEL.name: ("get_official_model_file", {}),
+                         Discipline.RIG.name: ("get_official_rig_file",
+                                               {"rig_type": RigTypes.ANI}),
+                         Discipline.SURFACE.name: ("get_active_surface_file", {})}
+
+    # The publish type of a discipline, when it isn't the discipline itself.
+    DISC_PUBLISH_TYPES = {Discipline.RIG.name: RigTypes.ANI}
+
+    def __init__(self, context=None, fingerprint=False, index=None, disciplines=None,
+                 history=None, scope=None):
+        """
+        :param context: The pipe context used to find the files.
+        :type: PipeContext
+
+        :param fingerprint: Whether to capture and compare geometry fingerprints too.
+        :type: bool
+
+        :param index: The HierarchyIndex to record every check in.
+        :type: HierarchyIndex
+
+        :param disciplines: The disciplines to check. The first one sets the
+                            hierarchy, the default is modeling, rigging and
+                            surfacing.
+        :type: list
+
+        :param history: The SnapshotHistory to keep every snapshot read in.
+        :type: SnapshotHistory
+
+        :param scope: The part of the hierarchy to check. The whole asset if not
+                      given.
+        :type: ExtractionScope
+        """
 
         # Attributes for assets.
         self.asset_obj = None
 
-        self.asset_disc_list = [Discipline.MODEL.name,
-                                Discipline.RIG.name,
-                                Discipline.SURFACE.name]
+        # Whether to capture and compare geometry fingerprints too. It needs NumPy.
+        self.fingerprint = fingerprint and fingerprints.has_numpy()
+
+        # The HierarchyIndex to record every check in, if there is one.
+        self.index = index
+
+        # The SnapshotHistory to keep every version of the snapshots in, if there is
+        # one.
+        self.history = history
+
+        # The part of the hierarchy to check. Scoped snapshots get their own text
+        # files so they never replace the full ones.
+        self.scope = scope or ExtractionScope()
+
+        self.asset_disc_list = list(disciplines or [Discipline.MODEL.name,
+                                                    Discipline.RIG.name,
+                                                    Discipline.SURFACE.name])
 
         if not context:
             self.context = PipeContext.basic()
@@ -133,6 +699,17 @@ class HierarchyCheckUtil(object):
         self.read_hier       = {}
         self.rig_fail        = []
         self.surface_fail    = []
+        self.fails           = {Discipline.RIG.name: self.rig_fail,
+                                Discipline.SURFACE.name: self.surface_fail}
+        self.diffs           = {}
+        self.multi_diff      = None
+        self.fingerprints    = {}
+        self.geo_changes     = {}
+
+        # The maya batch running right now, and whether stop was called so no more
+        # get started.
+        self.process = None
+        self.stopped = False
 
     def get_read_hiers(self):
         """
@@ -148,11 +725,24 @@ class HierarchyCheckUtil(object):
         :type: dict
         """
         # If we got nothing from modeling, there's no point in displaying anything.
-        if not self.read_hier[Discipline.MODEL.name]:
+        if not self.read_hier[self.asset_disc_list[0]]:
             return None
 
         return self.read_hier
 
+    def get_fail(self, disc):
+        """
+        Returns the list of nodes missing in a discipline that were present in
+        modeling.
+
+        :param disc: The discipline compared to modeling.
+        :type: str
+
+        :return: The list of modeling nodes that weren't found in the discipline.
+        :type: list
+        """
+        return self.fails.setdefault(disc, [])
+
     def get_rig_fail(self):
         """
         Returns the list of nodes missing in rigging that were present in modeling.
@@ -160,7 +750,7 @@ class HierarchyCheckUtil(object):
         :return: The list of modeling nodes that weren't found in rigging.
         :type: list
         """
-        return self.rig_fail
+        return self.get_fail(Discipline.RIG.name)
 
     def get_surface_fail(self):
         """
@@ -169,7 +759,34 @@ class HierarchyCheckUtil(object):
         :return: The list of modeling nodes that weren't found in surfacing.
         :type: list
         """
-        return self.surface_fail
+        return self.get_fail(Discipline.SURFACE.name)
+
+    def get_diff(self, disc):
+        """
+        Returns the full comparison for a discipline, including where moved nodes went
+        and the extra nodes.
+
+        :param disc: The discipline compared to modeling.
+        :type: str
+
+        :return: The comparison, None if that discipline wasn't compared.
+        :type: HierarchyDiff
+        """
+        return self.diffs.get(disc)
+
+    def get_geo_changes(self, disc):
+        """
+        Returns the meshes that kept their path but changed geometry compared to
+        modeling.
+
+        :param disc: The discipline compared to modeling.
+        :type: str
+
+        :return: The changed fields for each changed path, ie.
+                 {"|geometry_GRP|ren_GRP|pCylinder_REN": ["vertex_count"]}
+        :type: dict
+        """
+        return self.geo_changes.get(disc, {})
 
     def clear_attrs(self):
         """
@@ -177,20 +794,27 @@ class HierarchyCheckUtil(object):
         """
         self.text_file_paths.clear()
         self.read_hier.clear()
-        self.rig_fail.clear()
-        self.surface_fail.clear()
+        for curr_disc in self.fails:
+            self.fails[curr_disc].clear()
+        self.diffs.clear()
+        self.multi_diff = None
+        self.fingerprints.clear()
+        self.geo_changes.clear()
 
     def get_maya_files(self):
         """
         Gets the maya files we will grab the hierarchies from.
         """
         # Gets the necessary files in case we need to create the text files.
-        self.maya_file_paths[self.asset_disc_list[0]] = \
-            self.asset_obj.get_official_model_file()
-        self.maya_file_paths[self.asset_disc_list[1]] = \
-            self.asset_obj.get_official_rig_file(rig_type=RigTypes.ANI)
-        self.maya_file_paths[self.asset_disc_list[2]] = \
-            self.asset_obj.get_active_surface_file()
+        for curr_disc in self.asset_disc_list:
+            method_name, kwargs = self.DISC_FILE_GETTERS.get(
+                curr_disc, ("get_official_%s_file" % curr_disc, {}))
+            method = getattr(self.asset_obj, method_name, None)
+            if not method:
+                IO.warning("No way to find the %s file of the asset." % curr_disc)
+                self.maya_file_paths[curr_disc] = None
+                continue
+            self.maya_file_paths[curr_disc] = method(**kwargs)
 
     def set_asset_obj(self, asset_obj):
         """
@@ -219,12 +843,83 @@ class HierarchyCheckUtil(object):
         if not self.check_for_text_files(create=True):
             IO.error("No valid asset selected.")
             return None
+        elif self.stopped:
+            return None
 
-        # Gets hierarchy info from the text files.
+        # Gets hierarchy info from the text files, and keeps them in the history
+        # before they get overwritten.
         self.get_text_info()
+        self.update_history()
 
         # Figures out what is missing from modeling to rigging and surfacing.
-        if not self.match_items():
+        matched = self.match_items()
+
+        # Keep the project wide index up to date, even without a diff so nothing from
+        # an older check is left in it.
+        self.update_index()
+        if not matched:
+            return None
+
+        return True
+
+    def write_report(self, writer):
+        """
+        Writes the results of the asset to a report, a row for each discipline and
+        one for each node that didn't match.
+
+        :param writer: The report writer, ie. from get_report_writer.
+        :type: ReportWriter
+
+        :return: How many rows were written.
+        :type: int
+        """
+        if not self.asset_obj:
+            return 0
+
+        return writer.write_rows(iter_report_rows(self))
+
+    def update_history(self):
+        """
+        Adds the snapshots that were read to the history, if the util has one.
+        Snapshots that didn't change since the last version aren't added again.
+
+        :return: Success of the operation.
+        :type: bool
+        """
+        # A scoped snapshot is only part of the asset, it isn't a version of it.
+        if not self.history or not self.asset_obj or not self.scope.is_full():
+            return None
+
+        for curr_disc in self.read_hier:
+            if not self.read_hier[curr_disc]:
+                continue
+            try:
+                self.history.add_version(self.asset_obj.name, curr_disc,
+                                         self.read_hier[curr_disc],
+                                         source=self.text_file_paths.get(curr_disc))
+            except (IOError, OSError) as error:
+                IO.warning("Could not add the %s hierarchy to the history: %s" \
+                           % (curr_disc, error))
+                return None
+
+        return True
+
+    def update_index(self):
+        """
+        Records the snapshots and diffs in the index, if the util has one.
+
+        :return: Success of the operation.
+        :type: bool
+        """
+        # The index only holds full snapshots, a scoped one would look like most of
+        # the asset got deleted.
+        if not self.index or not self.asset_obj or not self.scope.is_full():
+            return None
+
+        try:
+            self.index.record_util(self)
+        except sqlite3.Error as error:
+            IO.warning("Could not update the hierarchy index: %s" % error)
             return None
 
         return True
@@ -238,18 +933,44 @@ class HierarchyCheckUtil(object):
             IO.error("No text files to delete.")
             return None
 
-        # Iterate through the text file paths found and try to delete them.
-        for curr_disc in self.text_file_paths:
-            curr_doc = self.text_file_paths[curr_disc]
-            if curr_doc == None:
+        # Delete the full text file of each discipline and every scoped one cut from
+        # it, "asset_hier_<key>.txt", not just the ones for this util's scope.
+        for curr_disc in self.asset_disc_list:
+            full_txt = self.get_text_file_path(curr_disc, scoped=False)
+            scoped_base = glob.escape(os.path.splitext(full_txt)[0])
+            self.remove_text_file(full_txt)
+            for curr_doc in glob.glob("%s_*.txt" % scoped_base):
+                self.remove_text_file(curr_doc)
+
+            # Fingerprints left behind by a txt that's already gone.
+            for curr_doc in glob.glob("%s_*.npz" % scoped_base):
+                self.remove_text_file(curr_doc)
+
+        return True
+
+    def remove_text_file(self, text_file_path):
+        """
+        Deletes a text file along with its fingerprints. The fingerprints go even if the
+        txt is already gone, so they don't outlive the hierarchy they were taken from.
+
+        :param text_file_path: The text file.
+        :type: str
+
+        :return: Success of the operation.
+        :type: bool
+        """
+        success = True
+        for curr_doc in (fingerprints.get_fingerprint_path(text_file_path),
+                         text_file_path):
+            if not os.path.exists(curr_doc):
                 continue
             try:
                 os.remove(curr_doc)
-            except WindowsError or OSError:
+            except OSError:
                 IO.error("Unable to delete: \n%s" % curr_doc)
-                continue
+                success = None
 
-        return True
+        return success
 
     def check_for_text_files(self, create=True):
         """
@@ -273,37 +994,50 @@ class HierarchyCheckUtil(object):
         if not self.asset_obj:
             return None
 
-        # Make the kwargs dictionary for context to find the file path.
-        kwargs = {"project": self.asset_obj.project_name}
-        kwargs["asset"] = self.asset_obj.name
-        kwargs["asset_type"] = self.asset_obj.type
-
-        # Check if each discipline has a text file. Change kwargs["publish_type"] each
-        # time to account for the discipline. Rigging will check "ani_rig", not just "rig.
+        # Check if each discipline has a text file.
         for curr_disc in self.asset_disc_list:
-            kwargs["publish_type"] = RigTypes.ANI if curr_disc == self.asset_disc_list[1] \
-                else curr_disc
-            dir_path = self.context.eval_path(formula=self.ASSET_DIR, **kwargs)
-            output_txt = "%s/%s_hier.txt" % (dir_path, self.asset_obj.name)
+            output_txt = self.get_text_file_path(curr_disc)
+
+            # A scoped txt older than the full txt is outdated. It gets cut again, or
+            # if it has type filters it's removed so the maya batch makes it again.
+            if self.is_scoped_text_file_stale(curr_disc):
+                if create == False:
+                    self.text_file_paths[curr_disc] = None
+                    continue
+                if not self.create_scoped_text_file(curr_disc):
+                    self.remove_text_file(output_txt)
 
             if not os.path.exists(output_txt):
                 # Ensure we want to create the text file.
                 if create == False:
                     self.text_file_paths[curr_disc] = None
                     continue
+                # A scope without type filters can be cut out of the full txt, no
+                # maya batch needed.
+                if self.create_scoped_text_file(curr_disc):
+                    self.text_file_paths[curr_disc] = output_txt
+                    continue
                 # Check if the maya file we're pulling the hierarchy from exists.
-                if not os.path.exists(self.maya_file_paths[curr_disc]):
+                if not self.maya_file_paths.get(curr_disc) or \
+                        not os.path.exists(self.maya_file_paths[curr_disc]):
                     IO.warning("No official %s was found." % curr_disc)
                     self.text_file_paths[curr_disc] = None
                     continue
+                # Nothing new gets started once the check was stopped.
+                if self.stopped:
+                    self.text_file_paths[curr_disc] = None
+                    continue
                 # Try to make the text file.
                 IO.info("Creating the %s %s hier file at \n%s" % (self.asset_obj.name, \
                                                                   curr_disc, output_txt))
                 if not self.maya_batch_create_txt(curr_disc,
                                                   self.maya_file_paths[curr_disc],
                                                   output_txt):
-                    IO.error("Was not able to create the files, took too long.")
-                    continue
+                    IO.error("Was not able to create the %s file." % curr_disc)
+                # Whether the maya batch finished before the timeout or after, the txt
+                # is there or it isn't.
+                self.text_file_paths[curr_disc] = output_txt \
+                    if os.path.exists(output_txt) else None
 
             # If the discipline already has a text file, add it to the list and continue.
             else:
@@ -313,6 +1047,100 @@ class HierarchyCheckUtil(object):
 
         return self.text_file_paths
 
+    def get_text_file_path(self, disc, scoped=True):
+        """
+        Gets where the text file of a discipline lives, whether it exists or not.
+
+        :param disc: The discipline.
+        :type: str
+
+        :param scoped: Get the util's scoped text file, "asset_hier_<key>.txt", when it
+                       has a scope. Otherwise it's the full one.
+        :type: bool
+
+        :return: The text file path, ie.
+                 "\\infinity.utdallas.edu\store\asset\ani_rig\asset_hier.txt"
+        :type: str
+        """
+        # Make the kwargs dictionary for context to find the file path. Rigging will
+        # check "ani_rig", not just "rig".
+        kwargs = {"project": self.asset_obj.project_name}
+        kwargs["asset"] = self.asset_obj.name
+        kwargs["asset_type"] = self.asset_obj.type
+        kwargs["publish_type"] = self.DISC_PUBLISH_TYPES.get(disc, disc)
+
+        dir_path = self.context.eval_path(formula=self.ASSET_DIR, **kwargs)
+
+        scope_key = self.scope.get_key() if scoped else None
+        if scope_key:
+            return "%s/%s_hier_%s.txt" % (dir_path, self.asset_obj.name, scope_key)
+
+        return "%s/%s_hier.txt" % (dir_path, self.asset_obj.name)
+
+    def is_scoped_text_file_stale(self, disc):
+        """
+        :param disc: The discipline.
+        :type: str
+
+        :return: Whether the discipline's full text file is newer than its scoped one.
+        :type: bool
+        """
+        if self.scope.is_full():
+            return False
+
+        full_txt = self.get_text_file_path(disc, scoped=False)
+        scoped_txt = self.get_text_file_path(disc)
+        if not os.path.exists(full_txt) or not os.path.exists(scoped_txt):
+            return False
+
+        return os.path.getmtime(full_txt) > os.path.getmtime(scoped_txt)
+
+    def create_scoped_text_file(self, disc):
+        """
+        Makes the scoped text file of a discipline out of its full one, with the
+        fingerprints cut down to match. This only works when the scope has no type
+        filters, those need Maya.
+
+        :param disc: The discipline.
+        :type: str
+
+        :return: Success of the operation.
+        :type: bool
+        """
+        if self.scope.is_full() or self.scope.has_type_filters():
+            return None
+
+        full_txt = self.get_text_file_path(disc, scoped=False)
+        if not os.path.exists(full_txt):
+            return None
+
+        # Older txts may not be normalized yet, and the sub-root is.
+        with open(full_txt, "r") as file1:
+            lines = [line.rstrip("\n") for line in file1]
+        nodes = self.scope.filter_paths(get_normalizer().normalize_all(lines, disc=disc))
+        if not nodes:
+            return None
+
+        mesh_fingerprints = None
+        if self.fingerprint:
+            full_fingerprints = fingerprints.GeometryFingerprints.load(
+                fingerprints.get_fingerprint_path(full_txt))
+            if full_fingerprints is not None:
+                mesh_fingerprints = full_fingerprints.select(nodes)
+
+        output_txt = self.get_text_file_path(disc)
+        try:
+            write_snapshot(nodes, output_txt, mesh_fingerprints=mesh_fingerprints)
+        except (IOError, OSError):
+            IO.error("Unable to write the scoped %s hier file at \n%s" % (disc,
+                                                                          output_txt))
+            return None
+
+        IO.success("Cut the scoped %s %s hier file out of \n%s" % (self.asset_obj.name,
+                                                                    disc, full_txt))
+
+        return True
+
     def maya_batch_create_txt(self, asset_disc=None, maya_file_path=None,
                               export_file_path=None):
         """
@@ -334,15 +1162,24 @@ class HierarchyCheckUtil(object):
         # MEL is automatically run so we use "python("")" to run python code.
         maya_cmd = ("python(\\\"import maya.cmds as cmds;"
                     "import maya_tools.utils.hierarchy_check_utils as hkUtil;"
-                    "hkUtil.store_hierarchy(\'%s\',\'%s\');\\\")" \
-                    % (asset_disc, export_file_path))
+                    "hkUtil.store_hierarchy(\'%s\',\'%s\',%s,\'%s\');\\\")" \
+                    % (asset_disc, export_file_path, self.fingerprint,
+                       self.scope.get_token()))
 
         cmd = ('mayabatch -file %s -command "%s"' % (maya_file_path, maya_cmd))
 
+        # Wait for any other maya batch to be done first.
+        _MAYA_BATCH_LOCK.acquire()
+
         # Try to create the file within 15 seconds.
         output = None
         try:
+            if self.stopped:
+                return None
             output = subprocess.Popen(cmd, shell=True, start_new_session=True)
+            self.process = output
+            if self.stopped:
+                return None  # Stopped before the process could be killed.
             output.wait(timeout=15)
         except subprocess.CalledProcessError:
             IO.error("Error creating file.")
@@ -350,23 +1187,42 @@ class HierarchyCheckUtil(object):
         except subprocess.TimeoutExpired:
             # We want the timer to finish from the subprocess, but the timer finishes
             # with an exception, so catch it here. We check if the maya batch created
-            # the file every 15 secs, for 10 times so after 3 minutes.
+            # the file every 15 secs, for 10 times so after 3 minutes. Waiting on the
+            # process instead of sleeping lets stop end this right away.
             counter = 0
-            while not os.path.exists(export_file_path) and counter < 10:
+            while not os.path.exists(export_file_path) and counter < 10 and \
+                    not self.stopped:
                 IO.info("Still creating the file...")
-                time.sleep(15)
+                try:
+                    output.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    pass
                 counter += 1
-            # If the text file was created then add to the file paths dict.
             if os.path.exists(export_file_path):
                 IO.success("Created the %s file, continuing the program." % asset_disc)
-                self.text_file_paths[asset_disc] = export_file_path
             else:
                 IO.error("%s txt file was not created" % asset_disc)
                 return None
         finally:
-            self.kill(output)  # Always kill the maya batches at the end.
+            self.process = None
+            if output is not None:
+                self.kill(output)  # Always kill the maya batches at the end.
+            _MAYA_BATCH_LOCK.release()
 
-        return self.text_file_paths
+        # The maya batch can also finish inside the wait, without writing anything if
+        # it couldn't find the root.
+        return True if os.path.exists(export_file_path) else None
+
+    def stop(self):
+        """
+        Stops the check from another thread, ie. when the prefetcher's selection
+        changed. The running maya batch is killed and no more get started, so
+        get_info gives up.
+        """
+        self.stopped = True
+        process = self.process
+        if process is not None:
+            self.kill(process)
 
     def kill(self, process):
         """
@@ -402,37 +1258,53 @@ class HierarchyCheckUtil(object):
             file1 = open(self.text_file_paths[curr_disc], "r")
             readlines = file1.readlines()
 
-            # Cut the \n at the end of all elements and put into the held list.
-            for line in readlines:
-                line = line.rstrip("\n")
-                self.read_hier[curr_disc].append(line)
+            file1.close()
+
+            # Cut the \n at the end of all elements and normalize the whole snapshot so
+            # older txts with namespaces or prefixes still line up.
+            lines = [line.rstrip("\n") for line in readlines]
+            self.read_hier[curr_disc] = get_normalizer().normalize_all(lines,
+                                                                       disc=curr_disc)
+
+            # Older txts won't have fingerprints, those just don't get compared.
+            if self.fingerprint:
+                fingerprint_path = fingerprints.get_fingerprint_path(
+                    self.text_file_paths[curr_disc])
+                self.fingerprints[curr_disc] = \
+                    fingerprints.GeometryFingerprints.load(fingerprint_path)
 
     def match_items(self):
         """
-        Checks if an item from model matches in rigging and surfacing. We don't care
-        about extra items in rigging or surfacing. We only check exactly what was
-        from modeling.
+        Checks if an item from model matches in every other discipline. We don't fail
+        on extra items downstream. We only check exactly what was from modeling, but
+        the diff tells missing nodes from moved ones. All the disciplines are
+        compared in one pass.
 
         :return: Success of the operation.
         :type: bool
         """
-        # Check if anything is in the published model, rigging, and working surfacing.
-        if not self.read_hier[Discipline.MODEL.name]:
+        # Check if anything is in the published model and the other disciplines.
+        reference = self.asset_disc_list[0]
+        if not self.read_hier[reference]:
             IO.warning("We did not get anything from the official modeling, quitting...")
             return None
-        if not self.read_hier[Discipline.RIG.name] and not \
-                self.read_hier[Discipline.SURFACE.name]:
+        others = [curr_disc for curr_disc in self.asset_disc_list[1:] \
+                  if self.read_hier[curr_disc]]
+        if not others:
             return None
-        # Simple loop through all the modeling items matching to rigging items.
-        if self.read_hier[Discipline.RIG.name]:
-            for item in self.read_hier[Discipline.MODEL.name]:
-                if not (item in self.read_hier[Discipline.RIG.name]):
-                    self.rig_fail.append(item)
-
-        # Simple loop through all the modeling items matching to surfacing items.
-        if self.read_hier[Discipline.SURFACE.name]:
-            for item in self.read_hier[Discipline.MODEL.name]:
-                if not (item in self.read_hier[Discipline.SURFACE.name]):
-                    self.surface_fail.append(item)
-
-        return True
\ No newline at end of file
+
+        # Compare every discipline to modeling. Moved nodes still count as fails, the
+        # diff keeps track of where they went.
+        snapshots = dict((curr_disc, self.read_hier[curr_disc]) \
+                         for curr_disc in [reference] + others)
+        self.multi_diff = diff_disciplines(snapshots, reference=reference)
+        for curr_disc in others:
+            self.diffs[curr_disc] = self.multi_diff.get_diff(curr_disc)
+            self.get_fail(curr_disc).extend(self.diffs[curr_disc].failures)
+
+            # Compare the geometry of every mesh that kept its path at once.
+            if self.fingerprints.get(curr_disc) and self.fingerprints.get(reference):
+                self.geo_changes[curr_disc] = self.fingerprints[curr_disc].compare(
+                    self.fingerprints[reference])
+
+        return True